@@ -1,25 +1,136 @@
 import os
+import threading
+from enum import Enum
 
+from sqlalchemy import URL, create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 
-class PostgresReadWriteConfig:
+postgres_host = "hydro-gis-postgres-scentralus-production.postgres.database.azure.com"
+postgres_database = "shoal_creek_wq_bio_mitigation"
+
+
+class PostgresConfig:
+
+    def __str__(self):
+        return self.conn_str
+
+    def async_url(self) -> URL:
+        return URL.create("postgresql+asyncpg", username=self.username, password=self.password, host=postgres_host,
+                          port=5432, database=postgres_database, query={"ssl": "require"})
+
+
+class PostgresReadWriteConfig(PostgresConfig):
 
     def __init__(self):
         self.username = os.environ["POSTGRES_SHOALCREEK_READWRITE_USERNAME"]
         self.password = os.environ["POSTGRES_SHOALCREEK_READWRITE_PASSWORD"]
-        self.conn_str = f"""postgresql://hydro-gis-postgres-scentralus-production.postgres.database.azure.com:5432
+        self.conn_str = f"""postgresql+psycopg2://hydro-gis-postgres-scentralus-production.postgres.database.azure.com:5432
         /?user={self.username}&password={self.password}&sslmode=require&database=shoal_creek_wq_bio_mitigation"""
 
-    def __str__(self):
-        return self.conn_str
-
 
-class PostgresReadOnlyConfig:
+class PostgresReadOnlyConfig(PostgresConfig):
 
     def __init__(self):
         self.username = os.environ["POSTGRES_SHOALCREEK_READONLY_USERNAME"]
         self.password = os.environ["POSTGRES_SHOALCREEK_READONLY_PASSWORD"]
-        self.conn_str = f"""postgresql://hydro-gis-postgres-scentralus-production.postgres.database.azure.com:5432
+        self.conn_str = f"""postgresql+psycopg2://hydro-gis-postgres-scentralus-production.postgres.database.azure.com:5432
         /?user={self.username}&password={self.password}&sslmode=require&database=shoal_creek_wq_bio_mitigation"""
 
-    def __str__(self):
-        return self.conn_str
+
+class PostgresPoolConfig:
+
+    def __init__(self):
+        self.pool_size = int(os.environ.get("POSTGRES_SHOALCREEK_POOL_SIZE", "5"))
+        self.max_overflow = int(os.environ.get("POSTGRES_SHOALCREEK_POOL_MAX_OVERFLOW", "10"))
+        self.pool_timeout = int(os.environ.get("POSTGRES_SHOALCREEK_POOL_TIMEOUT", "30"))
+        self.pool_recycle = int(os.environ.get("POSTGRES_SHOALCREEK_POOL_RECYCLE", "1800"))
+        self.pool_pre_ping = os.environ.get("POSTGRES_SHOALCREEK_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+    def engine_options(self) -> dict:
+        return {
+            "pool_size": self.pool_size,
+            "max_overflow": self.max_overflow,
+            "pool_timeout": self.pool_timeout,
+            "pool_recycle": self.pool_recycle,
+            "pool_pre_ping": self.pool_pre_ping
+        }
+
+
+class EngineRole(Enum):
+    READ_ONLY = 1
+    READ_WRITE = 2
+
+
+_engine_configs = {
+    EngineRole.READ_ONLY: PostgresReadOnlyConfig,
+    EngineRole.READ_WRITE: PostgresReadWriteConfig
+}
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(role: EngineRole = EngineRole.READ_ONLY) -> Engine:
+    engine = _engines.get(role)
+    if engine is not None:
+        return engine
+    with _engines_lock:
+        if role not in _engines:
+            _engines[role] = create_engine(_engine_configs[role]().__str__(), **PostgresPoolConfig().engine_options())
+        return _engines[role]
+
+
+class AsyncEngines:
+
+    def __init__(self):
+        self.engines = {}
+
+    def get(self, role: EngineRole = EngineRole.READ_ONLY) -> AsyncEngine:
+        if role not in self.engines:
+            self.engines[role] = create_async_engine(_engine_configs[role]().async_url(),
+                                                     **PostgresPoolConfig().engine_options())
+        return self.engines[role]
+
+    async def dispose(self):
+        for engine in self.engines.values():
+            await engine.dispose()
+        self.engines.clear()
+
+
+def dispose_engines():
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
+
+class QueryCacheConfig:
+
+    def __init__(self):
+        self.enabled = os.environ.get("SHOALCREEK_QUERY_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.cache_dir = os.environ.get("SHOALCREEK_QUERY_CACHE_DIR",
+                                        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                     ".cache", "queries"))
+        self.max_bytes = int(os.environ.get("SHOALCREEK_QUERY_CACHE_MAX_MB", "1024")) * 1024 * 1024
+        self.memoize_queryables = os.environ.get("SHOALCREEK_MEMOIZE_QUERYABLES",
+                                                 "false").lower() in ("1", "true", "yes")
+        self.memo_dir = os.environ.get("SHOALCREEK_MEMO_DIR",
+                                       os.path.join(os.path.dirname(self.cache_dir), "queryables"))
+        self.memo_max_bytes = int(os.environ.get("SHOALCREEK_MEMO_MAX_MB", "2048")) * 1024 * 1024
+
+
+class ParallelTransformConfig:
+
+    def __init__(self):
+        self.max_workers = int(os.environ.get("SHOALCREEK_TRANSFORM_WORKERS", str(os.cpu_count() or 1)))
+        self.min_rows = int(os.environ.get("SHOALCREEK_TRANSFORM_MIN_ROWS", "50000"))
+
+
+class RunReportConfig:
+
+    def __init__(self):
+        self.report_dir = os.environ.get("SHOALCREEK_RUN_REPORT_DIR",
+                                         os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                      ".cache", "reports"))
+        self.prometheus_textfile = os.environ.get("SHOALCREEK_PROMETHEUS_TEXTFILE",
+                                                  os.path.join(self.report_dir, "shoalcreek_pipeline.prom"))
@@ -1,13 +1,18 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 
 import geopandas
+import numpy
 import pandas
-from sqlalchemy import create_engine
-from config import PostgresReadOnlyConfig, PostgresReadWriteConfig
-import pandas
+from sqlalchemy import inspect, text
+
+import query_cache
+from config import EngineRole, PostgresPoolConfig, get_engine
+from water_quality_parameters import parameters, units
 
-conn_str = PostgresReadOnlyConfig().__str__()
-engine = create_engine(conn_str)
+logger = logging.getLogger(__name__)
 
 location_2222 = "Shoal Creek @ Shoal Edge Court (EII)"
 location_24th = "Shoal Creek @ 24th Street"
@@ -16,78 +21,22 @@ location_1st_upstream = "Shoal Creek Upstream of 1st St"
 
 default_interval = 120
 
-parameters_map = {
-    "temperature": ["Temperature, water", "Temperature, sample", "WATER TEMPERATURE"],
-    "phosphorus": [
-        "PHOSPHORUS AS P",
-        "ORTHOPHOSPHORUS AS P",
-        "Orthophosphate",
-        "Orthophosphate",
-        "Orthophosphate",
-        "PHOSPHATE AS PO4",
-        "Phosphorus"
-    ],
-    "nitrates": [
-        "NITRATE/NITRITE AS N",
-        "NITRATE AS N",
-        "Nitrate",
-        "Nitrogen, mixed forms (NH3), (NH4), organic, (NO2) and (NO3)",
-        "Organic Nitrogen",
-        "Inorganic nitrogen (nitrate and nitrite)",
-        "Inorganic nitrogen (nitrate and nitrite) ***retired***use Nitrate + Nitrite"
-    ],
-    "ph": ["PH", "pH"],
-    "ammonia": ["Ammonia and ammonium", "AMMONIA AS N", "Ammonia"],
-    "turbidity": ["Turbidity", "TURBIDITY"],
-    "conductivity": ["Specific conductance", "CONDUCTIVITY"],
-    "tss": ["Total suspended solids", "TOTAL SUSPENDED SOLIDS"],
-    "tds": ["TOTAL DISSOLVED SOLIDS", "Total dissolved solids"],
-    "ecoli": ["E COLI BACTERIA", "FECAL COLIFORM BACTERIA", "Fecal Coliform", "Escherichia coli", "Total Coliform"]
-}
-
-parameters_units_map = {
-    "temperature": ["deg C", "Deg. Celsius"],
-    "nitrates": ["mg/l as N", "mg/L", "mg/l asNO3", "MG/L", "mg/l asNO2", "mg/l NO3", "mg/l"],
-    "phosphorus": ["mg/L", "mg/l as P", "mg/l asPO4", "MG/L", "mg/l", "mg/l as P", "mg/l PO4"],
-    "ph": ["std units", "Standard units", "None"],
-    "ammonia": ["mg/L", "mg/L", "MG/L", "mg/l NH4", "mg/l as N"],
-    "turbidity": ["NTU", "None"],
-    "conductivity": ["uS/cm", "uS/cm @25C"],
-    "tss": ["mg/L", "Parts Per Million (PPM)", "MG/L", "mg/l"],
-    "tds": ["MG/L", "Parts Per Million (PPM)", "mg/L", "mg/l"],
-    "ecoli": ["MPN/100ML", "Colonies/100mL", "#/100mL", "cfu/100ml"]
-}
-
-parameters = [
-    "temperature",
-    "phosphorus",
-    "nitrates",
-    "ph",
-    "ammonia",
-    "turbidity",
-    "conductivity",
-    "tss",
-    "tds",
-    "ecoli"
-]
-
-units = {
-    "temperature": "deg. C",
-    "nitrates": "mg/l",
-    "phosphorus": "mg/l",
-    "ph": "standard units",
-    "ammonia": "mg/l",
-    "turbidity": "NTU",
-    "conductivity": "uS/cm",
-    "tss": "mg/L",
-    "tds": "mg/L",
-    "ecoli": "cfu/100ml"
-}
+antecedent_precipitation_windows = [1, 2, 3, 7]
 
+joined_value_columns = ["avg_value", "median_value", "max_value", "min_value"]
+
+interval_columns = ["sample_location", "geometry", "parameter", "avg_value", "median_value", "max_value", "min_value",
+                    "unit", "start_date", "end_date"]
 
 class Interval(Enum):
     DAILY = 1
-    QUADRIMESTER = 1
+    QUADRIMESTER = 2
+
+
+class Materialization(Enum):
+    PER_LOCATION = 1
+    SINGLE_PASS = 2
+    INCREMENTAL = 3
 
 
 def query_parameters_before_after_construction(parameters: list[str]):
@@ -99,11 +48,9 @@ def query_parameters_before_after_construction(parameters: list[str]):
     group by wq."parameter" , wq.start_date > '2013/09/01'
     order by wq."parameter", min(wq.start_date) desc;
     """
-    conn_str = PostgresReadOnlyConfig().__str__()
-    engine = create_engine(conn_str)
-    return geopandas.read_postgis(
-        sql=query_template,
-        con=engine, geom_col='geometry', crs="EPSG:26914")
+    return query_cache.read_postgis(
+        sql=query_template, tables=["water_quality_daily_intervals"],
+        con=get_engine(EngineRole.READ_ONLY), geom_col='geometry', crs="EPSG:26914")
 
 
 def query_parameters_before_after_construction_by_location(parameters: list[str], location: str):
@@ -115,35 +62,35 @@ def query_parameters_before_after_construction_by_location(parameters: list[str]
     group by wq.sample_location, wq."parameter" , wq.start_date > '2013/09/01'
     order by wq.sample_location, wq."parameter", min(wq.start_date) desc;
     """
-    conn_str = PostgresReadOnlyConfig().__str__()
-    engine = create_engine(conn_str)
-    return geopandas.read_postgis(
-        sql=query_template,
-        con=engine, geom_col='geometry', crs="EPSG:26914")
+    return query_cache.read_postgis(
+        sql=query_template, tables=["water_quality_daily_intervals"],
+        con=get_engine(EngineRole.READ_ONLY), geom_col='geometry', crs="EPSG:26914")
 
 
 def joined_parameters_query(out_parameters: list[str], out_locations: list[str], interval: Interval):
-    joined = geopandas.GeoDataFrame()
-    for index, filter_parameter in enumerate(out_parameters):
-        if interval == Interval.DAILY:
-            i = query_daily(filter_parameter, out_locations)
-        else:
-            i = query_quadrimester(filter_parameter, out_locations)
-
-        i = i.drop(['end_date', 'sample_location', 'geometry', 'parameter', 'unit'], axis=1)
-        if index == 0:
-            joined = pandas.concat([joined, i])
-        else:
-            joined = joined.merge(i, how='outer', on='start_date',
-                                  suffixes=(f'_{out_parameters[index - 1]}', f'_{filter_parameter}'))
+    table = "water_quality_daily_intervals" if interval == Interval.DAILY else "water_quality_intervals"
+    parameters_csv = ','.join(f"'{p}'" for p in out_parameters)
+    locations_csv = ','.join(f"'{p}'" for p in out_locations)
+    query_template = f"""
+        SELECT
+            wq."parameter",
+            wq.start_date,
+            max(wq.avg_value) as avg_value,
+            max(wq.median_value) as median_value,
+            max(wq.max_value) as max_value,
+            max(wq.min_value) as min_value
+        FROM public.{table} wq
+        where wq."parameter" in ({parameters_csv})
+            and wq.sample_location in ({locations_csv})
+        group by wq."parameter", wq.start_date, wq.end_date;
+    """
+    df = query_cache.read_sql(sql=query_template, tables=[table], con=get_engine(EngineRole.READ_ONLY))
 
-        if index == len(out_parameters) - 1:
-            joined = joined.rename(columns={
-                'avg_value': f'avg_value_{filter_parameter}',
-                'median_value': f'median_value_{filter_parameter}',
-                'max_value': f'max_value_{filter_parameter}',
-                'min_value': f'min_value_{filter_parameter}'})
-    return joined
+    joined = df.pivot(index="start_date", columns="parameter", values=joined_value_columns)
+    joined = joined.reindex(columns=pandas.MultiIndex.from_product([joined_value_columns, out_parameters]))
+    joined = joined[[(value, parameter) for parameter in out_parameters for value in joined_value_columns]]
+    joined.columns = [f"{value}_{parameter}" for value, parameter in joined.columns]
+    return joined.sort_index().reset_index()
 
 
 def query_quadrimester(parameter: str, sample_locations: list[str]):
@@ -166,11 +113,9 @@ def query_quadrimester(parameter: str, sample_locations: list[str]):
         group by wq.start_date, wq.end_date
         order by wq.start_date desc;
     """
-    conn_str = PostgresReadOnlyConfig().__str__()
-    engine = create_engine(conn_str)
-    return geopandas.read_postgis(
-        sql=query_template,
-        con=engine, geom_col='geometry', crs="EPSG:26914")
+    return query_cache.read_postgis(
+        sql=query_template, tables=["water_quality_intervals"],
+        con=get_engine(EngineRole.READ_ONLY), geom_col='geometry', crs="EPSG:26914")
 
 
 def query_daily(parameter: str, sample_locations: list[str]):
@@ -193,11 +138,9 @@ def query_daily(parameter: str, sample_locations: list[str]):
         group by wq.start_date, wq.end_date
         order by wq.start_date desc;
     """
-    conn_str = PostgresReadOnlyConfig().__str__()
-    engine = create_engine(conn_str)
-    return geopandas.read_postgis(
-        sql=query_template,
-        con=engine, geom_col='geometry', crs="EPSG:26914")
+    return query_cache.read_postgis(
+        sql=query_template, tables=["water_quality_daily_intervals"],
+        con=get_engine(EngineRole.READ_ONLY), geom_col='geometry', crs="EPSG:26914")
 
 
 def query_with_precip_daily(parameter: str, sample_location: str):
@@ -223,65 +166,172 @@ def query_with_precip_daily(parameter: str, sample_location: str):
         group by wq.start_date, wq.end_date
         order by wq.start_date desc;
     """
-    conn_str = PostgresReadOnlyConfig().__str__()
-    engine = create_engine(conn_str)
-    return geopandas.read_postgis(
-        sql=query_template,
-        con=engine, geom_col='geometry', crs="EPSG:26914")
+    return query_cache.read_postgis(
+        sql=query_template, tables=["water_quality_daily_intervals", "climate_daily"],
+        con=get_engine(EngineRole.READ_ONLY), geom_col='geometry', crs="EPSG:26914")
+
+
+def query_antecedent_precipitation(windows: list[int] = None) -> pandas.DataFrame:
+    windows = windows or antecedent_precipitation_windows
+    query_template = """
+        SELECT
+            cd.date_time::date as date,
+            max(cd.value) as value
+        FROM public.climate_daily cd
+        where cd."parameter" = 'Precipitation'
+        group by cd.date_time::date
+        order by cd.date_time::date;
+    """
+    df = query_cache.read_sql(sql=query_template, tables=["climate_daily"], con=get_engine(EngineRole.READ_ONLY))
+
+    precip = df.set_index(pandas.to_datetime(df["date"]))["value"].astype(float)
+    precip = precip.reindex(pandas.date_range(precip.index.min(), precip.index.max(), freq="D"))
+    antecedent = pandas.DataFrame(index=precip.index)
+    for window in windows:
+        rolling = precip.rolling(window, min_periods=1)
+        antecedent[f"sum_value_precip_{window}d"] = rolling.sum()
+        antecedent[f"max_value_precip_{window}d"] = rolling.max()
+    return antecedent.rename_axis("precip_date").reset_index()
+
+
+def join_antecedent_precipitation(df: pandas.DataFrame, date_column: str = "start_date",
+                                  windows: list[int] = None) -> pandas.DataFrame:
+    antecedent = query_antecedent_precipitation(windows)
+    df = df.assign(precip_date=pandas.to_datetime(df[date_column])).sort_values("precip_date")
+    joined = pandas.merge_asof(df, antecedent, on="precip_date", tolerance=pandas.Timedelta(0))
+    return joined.drop(columns="precip_date").sort_values(date_column, ascending=False, ignore_index=True)
+
+
+def query_with_antecedent_precip_daily(parameter: str, sample_location: str, windows: list[int] = None):
+    return join_antecedent_precipitation(query_daily(parameter, [sample_location]), windows=windows)
+
+
+def query_samples(out_parameters: list[str] = None) -> geopandas.GeoDataFrame:
+    parameters_filter = ""
+    if out_parameters:
+        parameters_csv = ','.join(f"'{p}'" for p in out_parameters)
+        parameters_filter = f"and wq.canonical_parameter in ({parameters_csv})"
+    query_template = f"""
+        SELECT
+            wq.sample_location,
+            wq.canonical_parameter as "parameter",
+            wq.value,
+            wq.sample_date_time,
+            wq.geometry
+        FROM public.water_quality wq
+        where wq.in_stream_corridor
+            and wq.canonical_parameter is not null
+            {parameters_filter}
+        order by wq.sample_location, wq.canonical_parameter, wq.sample_date_time;
+    """
+    return query_cache.read_postgis(
+        sql=query_template, tables=["water_quality"],
+        con=get_engine(EngineRole.READ_ONLY), geom_col='geometry', crs="EPSG:26914")
+
+
+def query_interval_anchor() -> pandas.Timestamp:
+    query_template = """
+        select min(wq.sample_date_time::date) as anchor
+        from public.water_quality wq
+        where wq.in_stream_corridor;
+    """
+    df = query_cache.read_sql(sql=query_template, tables=["water_quality"], con=get_engine(EngineRole.READ_ONLY))
+    return pandas.Timestamp(df["anchor"][0])
+
+
+def __window_medians(values: numpy.ndarray, lo: numpy.ndarray, hi: numpy.ndarray) -> numpy.ndarray:
+    lengths = hi - lo
+    offsets = numpy.concatenate([[0], numpy.cumsum(lengths)[:-1]])
+    windows = numpy.repeat(numpy.arange(len(lo)), lengths)
+    members = numpy.repeat(lo - offsets, lengths) + numpy.arange(lengths.sum())
+    ordered = values[members][numpy.lexsort((values[members], windows))]
+    return (ordered[offsets + (lengths - 1) // 2] + ordered[offsets + lengths // 2]) / 2
+
+
+def aggregate_intervals(samples: geopandas.GeoDataFrame, windows: list[int] = None, offsets: list[int] = None,
+                        step: int = None, anchor=None) -> geopandas.GeoDataFrame:
+    windows = windows or [default_interval]
+    offsets = offsets or [0]
+    sample_dates = pandas.to_datetime(samples["sample_date_time"]).dt.normalize()
+    anchor = pandas.Timestamp(anchor) if anchor is not None else query_interval_anchor()
+    samples = samples.assign(day=(sample_dates - anchor).dt.days.to_numpy()) \
+        .sort_values(["sample_location", "parameter", "day"], kind="stable")
+    days = samples["day"].to_numpy()
+    values = samples["value"].to_numpy(dtype=float)
+    geometries = samples.geometry.to_numpy()
+    max_day = days.max() if len(days) else 0
+
+    frames = []
+    groups = samples.groupby(["sample_location", "parameter"], sort=False).indices
+    for (sample_location, parameter), indexes in groups.items():
+        group_days = days[indexes]
+        group_values = values[indexes]
+        padded = numpy.append(group_values, numpy.nan)
+        group_geometries = geometries[indexes]
+        cumulative = numpy.concatenate([[0.0], numpy.cumsum(group_values)])
+        for window in windows:
+            window_step = step or window
+            for offset in offsets:
+                first = -((window - 1 + offset) // window_step)
+                last = (max_day - offset) // window_step
+                starts = offset + numpy.arange(first, last + 1) * window_step
+                lo = numpy.searchsorted(group_days, starts, side="left")
+                hi = numpy.searchsorted(group_days, starts + window, side="left")
+                filled = hi > lo
+                starts, lo, hi = starts[filled], lo[filled], hi[filled]
+                if len(starts) == 0:
+                    continue
+                bounds = numpy.column_stack([lo, hi]).ravel()
+                frames.append(pandas.DataFrame({
+                    "sample_location": sample_location,
+                    "geometry": group_geometries[lo],
+                    "parameter": parameter,
+                    "avg_value": (cumulative[hi] - cumulative[lo]) / (hi - lo),
+                    "median_value": __window_medians(group_values, lo, hi),
+                    "max_value": numpy.maximum.reduceat(padded, bounds)[::2],
+                    "min_value": numpy.minimum.reduceat(padded, bounds)[::2],
+                    "unit": units.get(parameter),
+                    "start_date": anchor + pandas.to_timedelta(starts, unit="D"),
+                    "end_date": anchor + pandas.to_timedelta(starts + window, unit="D"),
+                    "interval": window,
+                    "offset": offset
+                }))
+
+    columns = interval_columns + ["interval", "offset"]
+    if not frames:
+        return geopandas.GeoDataFrame(columns=columns, geometry="geometry", crs=samples.crs)
+    intervals = pandas.concat(frames, ignore_index=True)[columns]
+    intervals = intervals.sort_values(["interval", "offset", "sample_location", "parameter", "start_date"],
+                                      ascending=[True, True, True, True, False], ignore_index=True)
+    return geopandas.GeoDataFrame(intervals, geometry="geometry", crs=samples.crs)
 
 
 def locations_query(exclude: str = None):
     query_template = f"""
     select wq.sample_location
-    from public.water_quality wq 
-    where 
-        ST_Intersects(
-            wq.geometry, 
-            (
-                select ST_Buffer
-                (
-                    (select ST_LineMerge(ST_Union(h.geometry)) from public.hydrography h),
-                    25
-                )
-            )
-        )
+    from public.water_quality wq
+    where wq.in_stream_corridor
         and wq.sample_location not in ('{exclude}')
     group by wq.sample_location
     order by wq.sample_location
     """
 
-    df = pandas.read_sql_query(
-        sql=query_template,
-        con=engine)
+    df = query_cache.read_sql(
+        sql=query_template, tables=["water_quality"],
+        con=get_engine(EngineRole.READ_ONLY))
     return list(df["sample_location"])
 
 
-def __water_quality_interval_query(parameters: list[str],
-                                   parameters_units: list[str],
-                                   sample_location: str,
+def __water_quality_interval_query(sample_location: str,
                                    parameter: str,
                                    unit: str,
                                    interval: int = 120, include_null_intervals=True) -> pandas.DataFrame:
-    parameters_csv = ','.join(f"'{p}'" for p in parameters)
-    parameters_units_csv = ','.join(f"'{p}'" for p in parameters_units)
-
     query_template = f"""
     with
     buffered_stream as (
         select wq.*
-        from public.water_quality wq 
-        where 
-            ST_Intersects(
-                wq.geometry, 
-                (
-                    select ST_Buffer
-                    (
-                        (select ST_LineMerge(ST_Union(h.geometry)) from public.hydrography h),
-                        25
-                    )
-                )
-            )
-        order by wq.sample_location
+        from public.water_quality wq
+        where wq.in_stream_corridor
     ),
     intervals as (
         select 
@@ -305,8 +355,7 @@ def __water_quality_interval_query(parameters: list[str],
        i.end_date
        FROM intervals i
        left outer join buffered_stream wq on wq.sample_date_time::date >= i.start_date and wq.sample_date_time::date < i.end_date  
-           {'where' if include_null_intervals else 'and'} wq."parameter" in ({parameters_csv})
-                and wq.unit in ({parameters_units_csv})
+           {'where' if include_null_intervals else 'and'} wq.canonical_parameter = '{parameter}'
                 and wq.sample_location in ('{sample_location}')
         group by i.start_date, i.end_date
         order by i.start_date desc;
@@ -315,38 +364,22 @@ def __water_quality_interval_query(parameters: list[str],
 
     df = geopandas.read_postgis(
         sql=query_template,
-        con=engine, geom_col='geometry', crs="EPSG:26914")
+        con=get_engine(EngineRole.READ_ONLY), geom_col='geometry', crs="EPSG:26914")
     df["unit"] = unit
     df["parameter"] = parameter
     df["sample_location"] = sample_location
     return df
 
 
-def __water_quality_daily_query(parameters: list[str],
-                                parameters_units: list[str],
-                                sample_location: str,
+def __water_quality_daily_query(sample_location: str,
                                 parameter: str,
                                 unit: str) -> pandas.DataFrame:
-    parameters_csv = ','.join(f"'{p}'" for p in parameters)
-    parameters_units_csv = ','.join(f"'{p}'" for p in parameters_units)
-
     query_template = f"""
     with
     buffered_stream as (
         select wq.*
-        from public.water_quality wq 
-        where 
-            ST_Intersects(
-                wq.geometry, 
-                (
-                    select ST_Buffer
-                    (
-                        (select ST_LineMerge(ST_Union(h.geometry)) from public.hydrography h),
-                        25
-                    )
-                )
-            )
-        order by wq.sample_location
+        from public.water_quality wq
+        where wq.in_stream_corridor
     )
       SELECT 
         max(sample_location) as sample_location,
@@ -359,8 +392,7 @@ def __water_quality_daily_query(parameters: list[str],
         max(wq.unit) as unit,
        wq.sample_date_time::date as start_date, 
        wq.sample_date_time::date as end_date
-       FROM buffered_stream wq where wq."parameter" in ({parameters_csv})
-                and wq.unit in ({parameters_units_csv})
+       FROM buffered_stream wq where wq.canonical_parameter = '{parameter}'
                 and wq.sample_location in ('{sample_location}')
         group by wq.sample_date_time::date
         order by wq.sample_date_time::date desc;
@@ -369,44 +401,253 @@ def __water_quality_daily_query(parameters: list[str],
 
     df = geopandas.read_postgis(
         sql=query_template,
-        con=engine, geom_col='geometry', crs="EPSG:26914")
+        con=get_engine(EngineRole.READ_ONLY), geom_col='geometry', crs="EPSG:26914")
     df["unit"] = unit
     df["parameter"] = parameter
     df["sample_location"] = sample_location
     return df
 
 
-def __write_intervals():
-    locations = locations_query()
-    engine = create_engine(PostgresReadWriteConfig().__str__())
-    location_intervals = geopandas.GeoDataFrame()
-    for location in locations:
-        wq_intervals = geopandas.GeoDataFrame()
-        for filter_parameter in parameters:
-            wq_df = __water_quality_interval_query(parameters=parameters_map[filter_parameter],
-                                                   parameters_units=parameters_units_map[filter_parameter],
-                                                   sample_location=location,
-                                                   unit=units[filter_parameter], parameter=filter_parameter,
-                                                   interval=default_interval)
-            wq_intervals = pandas.concat([wq_intervals, wq_df])
-        location_intervals = pandas.concat([location_intervals, wq_intervals])
-    location_intervals.to_postgis("water_quality_intervals", con=engine, if_exists='replace')
-
-
-def __write_days():
-    locations = locations_query()
-    engine = create_engine(PostgresReadWriteConfig().__str__())
-    location_intervals = geopandas.GeoDataFrame()
-    for location in locations:
-        wq_intervals = geopandas.GeoDataFrame()
-        for filter_parameter in parameters:
-            wq_df = __water_quality_daily_query(parameters=parameters_map[filter_parameter],
-                                                parameters_units=parameters_units_map[filter_parameter],
-                                                sample_location=location,
-                                                unit=units[filter_parameter], parameter=filter_parameter)
-            wq_intervals = pandas.concat([wq_intervals, wq_df])
-        location_intervals = pandas.concat([location_intervals, wq_intervals])
-    location_intervals.to_postgis("water_quality_daily_intervals", con=engine, if_exists='replace')
+def query_locations_parameters(sample_locations: list[str], out_parameters: list[str], interval: int = None,
+                               max_workers: int = None) -> geopandas.GeoDataFrame:
+    max_workers = max_workers or PostgresPoolConfig().pool_size
+
+    def run(sample_location: str, parameter: str) -> pandas.DataFrame:
+        started = time.perf_counter()
+        if interval is None:
+            df = __water_quality_daily_query(sample_location=sample_location, parameter=parameter,
+                                             unit=units[parameter])
+        else:
+            df = __water_quality_interval_query(sample_location=sample_location, parameter=parameter,
+                                                unit=units[parameter], interval=interval)
+        logger.info("Queried %s for %s: %d rows in %.2fs", parameter, sample_location, len(df),
+                    time.perf_counter() - started)
+        return df
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run, sample_location, parameter)
+                   for sample_location in sample_locations
+                   for parameter in out_parameters]
+        frames = [future.result() for future in futures]
+    return pandas.concat(frames, ignore_index=True)
+
+
+def __samples_cte() -> str:
+    return """
+    samples as (
+        select
+            wq.canonical_parameter as "parameter",
+            wq.sample_location,
+            wq.geometry,
+            wq.value,
+            wq.sample_date_time
+        from buffered_stream wq
+        where wq.canonical_parameter is not null
+    )
+    """
+
+
+def __affected_ctes(table: str, bucket: str) -> str:
+    return f""",
+    watermarks as (
+        select w.sample_location, w."parameter", w.max_sample_date_time
+        from public.water_quality_watermarks w
+        where w.table_name = '{table}'
+    ),
+    affected as (
+        select distinct s.sample_location, s."parameter", {bucket} as start_date
+        from samples s
+        left outer join watermarks w on w.sample_location = s.sample_location and w."parameter" = s."parameter"
+        where w.max_sample_date_time is null or s.sample_date_time > w.max_sample_date_time
+    )
+    """
+
+
+def __water_quality_intervals_all_query(interval: int = 120, incremental: bool = False) -> pandas.DataFrame:
+    bucket = f"""(select min(sample_date_time::date) from buffered_stream) + 
+        ((((s.sample_date_time::date - (select min(sample_date_time::date) from buffered_stream)) / {interval}) 
+        * {interval}) || ' day')::interval"""
+    affected_ctes = __affected_ctes("water_quality_intervals", bucket) if incremental else ""
+    affected_join = """inner join affected a on a.sample_location = wq.sample_location
+            and a."parameter" = wq."parameter" and a.start_date = i.start_date""" if incremental else ""
+    query_template = f"""
+    with
+    buffered_stream as (
+        select wq.*
+        from public.water_quality wq
+        where wq.in_stream_corridor
+    ),
+    {__samples_cte()}{affected_ctes},
+    intervals as (
+        select 
+            (select min(sample_date_time::date) from buffered_stream s) + ( n    || ' day')::interval start_date,
+            (select min(sample_date_time::date) from buffered_stream s) + ((n+{interval}) || ' day')::interval end_date
+          from generate_series(
+          0, 
+          ((select max(sample_date_time::date) from buffered_stream s) - (select min(sample_date_time::date) from buffered_stream s)),
+          {interval}) n
+      )
+      SELECT 
+        wq.sample_location,
+        max(wq.geometry) as geometry,
+        wq."parameter",
+        avg(wq.value) as avg_value,
+        PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY wq.value) as median_value,
+        max(wq.value) as max_value,
+        min(wq.value) as min_value,
+        i.start_date, 
+        i.end_date
+       FROM intervals i
+       inner join samples wq on wq.sample_date_time::date >= i.start_date and wq.sample_date_time::date < i.end_date
+       {affected_join}
+        group by wq.sample_location, wq."parameter", i.start_date, i.end_date
+        order by wq.sample_location, wq."parameter", i.start_date desc;
+    """
+
+    df = geopandas.read_postgis(
+        sql=query_template,
+        con=get_engine(EngineRole.READ_ONLY), geom_col='geometry', crs="EPSG:26914")
+    df["unit"] = df["parameter"].map(units)
+    return df[interval_columns]
+
+
+def __water_quality_daily_all_query(incremental: bool = False) -> pandas.DataFrame:
+    affected_ctes = __affected_ctes("water_quality_daily_intervals", "s.sample_date_time::date") \
+        if incremental else ""
+    affected_join = """inner join affected a on a.sample_location = wq.sample_location
+            and a."parameter" = wq."parameter" and a.start_date = wq.sample_date_time::date""" if incremental else ""
+    query_template = f"""
+    with
+    buffered_stream as (
+        select wq.*
+        from public.water_quality wq
+        where wq.in_stream_corridor
+    ),
+    {__samples_cte()}{affected_ctes}
+      SELECT 
+        wq.sample_location,
+        max(wq.geometry) as geometry,
+        wq."parameter",
+        avg(wq.value) as avg_value,
+        PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY wq.value) as median_value,
+        max(wq.value) as max_value,
+        min(wq.value) as min_value,
+        wq.sample_date_time::date as start_date, 
+        wq.sample_date_time::date as end_date
+       FROM samples wq
+       {affected_join}
+        group by wq.sample_location, wq."parameter", wq.sample_date_time::date
+        order by wq.sample_location, wq."parameter", wq.sample_date_time::date desc;
+    """
+
+    df = geopandas.read_postgis(
+        sql=query_template,
+        con=get_engine(EngineRole.READ_ONLY), geom_col='geometry', crs="EPSG:26914")
+    df["unit"] = df["parameter"].map(units)
+    return df[interval_columns]
+
+
+def __write_watermarks(conn, table: str, reset: bool):
+    conn.execute(text("""
+        create table if not exists public.water_quality_watermarks (
+            table_name text not null,
+            sample_location text not null,
+            "parameter" text not null,
+            max_sample_date_time timestamp not null,
+            primary key (table_name, sample_location, "parameter")
+        )
+    """))
+    if reset:
+        conn.execute(text("delete from public.water_quality_watermarks where table_name = :table"), {"table": table})
+    conn.execute(text(f"""
+    with
+    buffered_stream as (
+        select wq.*
+        from public.water_quality wq
+        where wq.in_stream_corridor
+    ),
+    {__samples_cte()}
+    insert into public.water_quality_watermarks (table_name, sample_location, "parameter", max_sample_date_time)
+    select '{table}', s.sample_location, s."parameter", max(s.sample_date_time)
+    from samples s
+    group by s.sample_location, s."parameter"
+    on conflict (table_name, sample_location, "parameter")
+        do update set max_sample_date_time = excluded.max_sample_date_time
+    """))
+
+
+def __replace_intervals(table: str, df: geopandas.GeoDataFrame):
+    with get_engine(EngineRole.READ_WRITE).begin() as conn:
+        df.to_postgis(table, con=conn, if_exists='replace')
+        __write_watermarks(conn, table, reset=True)
+    query_cache.invalidate(table)
+
+
+def __upsert_intervals(table: str, df: geopandas.GeoDataFrame):
+    columns_csv = ','.join(f'"{c}"' for c in interval_columns)
+    with get_engine(EngineRole.READ_WRITE).begin() as conn:
+        if len(df) > 0:
+            df.to_postgis(f"{table}_increment", con=conn, if_exists='replace')
+            conn.execute(text(f"""
+                delete from public.{table} t
+                using public.{table}_increment i
+                where t.sample_location = i.sample_location
+                    and t."parameter" = i."parameter"
+                    and t.start_date = i.start_date;
+                insert into public.{table} ({columns_csv})
+                select {columns_csv} from public.{table}_increment;
+                drop table public.{table}_increment;
+            """))
+        __write_watermarks(conn, table, reset=False)
+    query_cache.invalidate(table)
+
+
+def __can_refresh_incrementally(table: str, interval: int = None) -> bool:
+    engine = get_engine(EngineRole.READ_WRITE)
+    if not inspect(engine).has_table(table, schema="public") or \
+            not inspect(engine).has_table("water_quality_watermarks", schema="public"):
+        return False
+    if interval is None:
+        return True
+    with engine.connect() as conn:
+        aligned = conn.execute(text(f"""
+            select ((t.start_date::date - a.min_date) % {interval}) = 0
+                and (t.end_date::date - t.start_date::date) = {interval}
+            from (select start_date, end_date from public.{table} limit 1) t,
+                 (select min(sample_date_time::date) as min_date
+                    from public.water_quality where in_stream_corridor) a
+        """)).scalar()
+    return bool(aligned)
+
+
+def __write_intervals(materialization: Materialization = Materialization.SINGLE_PASS, max_workers: int = None):
+    if materialization == Materialization.INCREMENTAL:
+        if __can_refresh_incrementally("water_quality_intervals", interval=default_interval):
+            __upsert_intervals("water_quality_intervals",
+                               __water_quality_intervals_all_query(interval=default_interval, incremental=True))
+            return
+        materialization = Materialization.SINGLE_PASS
+
+    if materialization == Materialization.SINGLE_PASS:
+        location_intervals = __water_quality_intervals_all_query(interval=default_interval)
+    else:
+        location_intervals = query_locations_parameters(locations_query(), parameters, interval=default_interval,
+                                                        max_workers=max_workers)
+    __replace_intervals("water_quality_intervals", location_intervals)
+
+
+def __write_days(materialization: Materialization = Materialization.SINGLE_PASS, max_workers: int = None):
+    if materialization == Materialization.INCREMENTAL:
+        if __can_refresh_incrementally("water_quality_daily_intervals"):
+            __upsert_intervals("water_quality_daily_intervals", __water_quality_daily_all_query(incremental=True))
+            return
+        materialization = Materialization.SINGLE_PASS
+
+    if materialization == Materialization.SINGLE_PASS:
+        location_intervals = __water_quality_daily_all_query()
+    else:
+        location_intervals = query_locations_parameters(locations_query(), parameters, max_workers=max_workers)
+    __replace_intervals("water_quality_daily_intervals", location_intervals)
 
 
 if __name__ == '__main__':
@@ -1,17 +1,29 @@
 from pathlib import Path
-from typing import Union
-from enum import Enum
+from typing import Iterator, Optional, Union
 import geopandas
 import pandas
 from typing import TypeVar
 from abc import ABC
-from osgeo import ogr
-import tempfile, subprocess, os
+import asyncio, json, logging, os, shutil, time
+from concurrent.futures import ThreadPoolExecutor
 
-from sqlalchemy import create_engine
+import numpy
+import pyarrow.dataset
+import pyarrow.parquet
+import pyogrio
+import shapely
+
+import query_cache
+from config import AsyncEngines, EngineRole, QueryCacheConfig, get_engine
+from pipelines.arrow_io import default_batch_size, default_row_group_size, geopackage_bulk_options, \
+    geoparquet_table
+from pipelines.instrumentation import StageMetrics, measure, measured_batches
+from pipelines.postgis_loader import PostgisLoadMethod, relation_size, write_postgis
 
 TPipeline = TypeVar("TPipeline", bound="Pipeline")
 
+logger = logging.getLogger(__name__)
+
 
 class Loadable(ABC):
 
@@ -27,45 +39,240 @@ class Queryable(ABC):
     def query(self) -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
         pass
 
+    def query_batches(self, batch_size: int = default_batch_size) \
+            -> Iterator[Union[geopandas.GeoDataFrame, pandas.DataFrame]]:
+        yield self.query()
+
+    def source_stamp(self) -> Optional[str]:
+        return None
+
+    async def query_async(self, engines: AsyncEngines) -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
+        return await asyncio.to_thread(self.query)
+
 
 class Transformable(ABC):
+    schema: dict[str, str] = {}
 
     def transform(self, df: Union[geopandas.GeoDataFrame, pandas.DataFrame]) -> geopandas.GeoDataFrame:
         pass
 
 
+truthy_flags = ["T", "TRUE", "Y", "YES", "1"]
+
+
+def apply_schema(df: Union[geopandas.GeoDataFrame, pandas.DataFrame], schema: dict[str, str]) \
+        -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
+    missing = [column for column in schema if column not in df.columns]
+    if missing:
+        raise ValueError(f'Frame is missing schema columns {missing}')
+    converted = {}
+    for column, dtype in schema.items():
+        if dtype == "boolean" and not pandas.api.types.is_bool_dtype(df[column]):
+            flags = df[column].astype("string").str.strip().str.upper().isin(truthy_flags)
+            converted[column] = flags.astype("boolean").mask(df[column].isna())
+        else:
+            converted[column] = df[column].astype(dtype)
+    return df.assign(**converted)
+
+
+def geopackage_stamp(db_path: str) -> str:
+    stat = os.stat(db_path)
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def postgres_stamp(tables: list[str], role: EngineRole = EngineRole.READ_WRITE) -> str:
+    return query_cache.table_stamp(tables, get_engine(role))
+
+
+def intersecting(df: geopandas.GeoDataFrame, boundary: shapely.Geometry) -> geopandas.GeoDataFrame:
+    shapely.prepare(boundary)
+    tree = shapely.STRtree(df.geometry.to_numpy())
+    return df.iloc[numpy.sort(tree.query(boundary, predicate="intersects"))]
+
+
+async def read_postgres_async(sql: str, engine, geom_col: str = None, crs=None) \
+        -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
+    async with engine.connect() as conn:
+        result = await conn.exec_driver_sql(sql)
+        df = pandas.DataFrame(result.fetchall(), columns=list(result.keys()))
+    if geom_col is None:
+        return df
+    df[geom_col] = shapely.from_wkb(df[geom_col].to_numpy())
+    return geopandas.GeoDataFrame(df, geometry=geom_col, crs=crs)
+
+
+def read_postgres_batches(sql: str, role: EngineRole, batch_size: int = default_batch_size) \
+        -> Iterator[pandas.DataFrame]:
+    with get_engine(role).connect().execution_options(stream_results=True) as conn:
+        for df in pandas.read_sql_query(sql=sql, con=conn, chunksize=batch_size):
+            yield df
+
+
 class Pipeline:
 
     def __init__(self):
         self.df = geopandas.GeoDataFrame()
+        self.batches = None
+        self.consumed = False
+        self.stages = []
+
+    @staticmethod
+    def of(df: Union[geopandas.GeoDataFrame, pandas.DataFrame]) -> TPipeline:
+        pipeline = Pipeline()
+        pipeline.df = df
+        return pipeline
 
     def load(self, load: Loadable) -> TPipeline:
-        self.df = load.load()
+        with measure(self.__stage("load", type(load).__name__)) as metrics:
+            self.df = load.load()
+        metrics.rows_out = len(self.df)
         return self
 
-    def query(self, queryable: Queryable) -> TPipeline:
-        self.df = queryable.query()
+    def query(self, queryable: Queryable, memoize: bool = None) -> TPipeline:
+        with measure(self.__stage("query", type(queryable).__name__)) as metrics:
+            if memoize if memoize is not None else QueryCacheConfig().memoize_queryables:
+                self.df = query_cache.memoized_query(queryable)
+            else:
+                self.df = queryable.query()
+        metrics.rows_out = len(self.df)
+        return self
+
+    @staticmethod
+    def gather(queryables: dict[str, Queryable], memoize: bool = None) -> dict[str, TPipeline]:
+        memoize = memoize if memoize is not None else QueryCacheConfig().memoize_queryables
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(Pipeline.__gather(queryables, memoize))
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, Pipeline.__gather(queryables, memoize)).result()
+
+    @staticmethod
+    async def __gather(queryables: dict[str, Queryable], memoize: bool) -> dict[str, TPipeline]:
+        engines = AsyncEngines()
+        pipelines = {name: Pipeline() for name in queryables}
+        try:
+            await asyncio.gather(*(pipelines[name].__query_async(queryable, engines, memoize)
+                                   for name, queryable in queryables.items()))
+        finally:
+            await engines.dispose()
+        return pipelines
+
+    async def __query_async(self, queryable: Queryable, engines: AsyncEngines, memoize: bool):
+        with measure(self.__stage("query", type(queryable).__name__)) as metrics:
+            if memoize:
+                self.df = await query_cache.memoized_query_async(queryable, engines)
+            else:
+                self.df = await queryable.query_async(engines)
+        metrics.rows_out = len(self.df)
+
+    def stream(self, queryable: Queryable, batch_size: int = default_batch_size) -> TPipeline:
+        self.batches = measured_batches(self.__stage("query", type(queryable).__name__),
+                                        queryable.query_batches(batch_size))
         return self
 
     def transform(self, transformable: Transformable) -> TPipeline:
-        self.df = transformable.transform(self.df)
+        metrics = self.__stage("transform", type(transformable).__name__)
+        if self.batches is not None:
+            self.batches = self.__transform_batches(transformable, metrics, self.batches)
+        else:
+            metrics.rows_in = len(self.df)
+            with measure(metrics):
+                self.df = apply_schema(transformable.transform(self.df), transformable.schema)
+            metrics.rows_out = len(self.df)
         return self
 
+    def __stage(self, stage: str, name: str) -> StageMetrics:
+        metrics = StageMetrics(stage, name)
+        self.stages.append(metrics)
+        return metrics
+
+    @staticmethod
+    def __transform_batches(transformable: Transformable, metrics: StageMetrics,
+                            batches: Iterator[Union[geopandas.GeoDataFrame, pandas.DataFrame]]) \
+            -> Iterator[Union[geopandas.GeoDataFrame, pandas.DataFrame]]:
+        for batch in batches:
+            metrics.rows_in += len(batch)
+            with measure(metrics):
+                batch = apply_schema(transformable.transform(batch), transformable.schema)
+            metrics.rows_out += len(batch)
+            yield batch
+
+    def is_streaming(self) -> bool:
+        return self.batches is not None
+
+    def frames(self) -> Iterator[Union[geopandas.GeoDataFrame, pandas.DataFrame]]:
+        if self.consumed:
+            raise ValueError('Streamed pipeline batches have already been consumed')
+        if self.batches is None:
+            yield self.df
+            return
+        batches, self.batches, self.consumed = self.batches, None, True
+        yield from batches
+
     def dataframe(self) -> geopandas.GeoDataFrame:
+        if self.consumed:
+            raise ValueError('Streamed pipeline batches have already been consumed')
+        if self.batches is not None:
+            batches = list(self.batches)
+            self.df = pandas.concat(batches, ignore_index=True)
+            if batches:
+                self.df = self.df.astype({c: "category" for c, dtype in batches[0].dtypes.items()
+                                          if isinstance(dtype, pandas.CategoricalDtype)})
+            self.batches = None
         return self.df
 
-    def export_geopackage(self, geopackage_path: str, layer_name: str):
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_gpkg_path = os.path.join(temp_dir, 'temp.gpkg')
-            self.df.to_file(temp_gpkg_path, layer=layer_name, driver="GPKG", mode='w')
-            append_cmd = f'ogr2ogr -f "GPKG" {geopackage_path} "{temp_gpkg_path}" -nln {layer_name} -progress -update -overwrite'
-            subprocess.run(append_cmd, shell=True)
-
-    def export_parquet(self, layer_name: str):
-        Path(f"data/{layer_name}").mkdir(parents=True, exist_ok=True)
-        self.df.to_parquet(f"data/{layer_name}/{layer_name}.parquet")
+    def export_geopackage(self, geopackage_path: str, layer_name: str, part: int = 0):
+        started = time.perf_counter()
+        size_before = os.path.getsize(geopackage_path) if os.path.exists(geopackage_path) else 0
+        rows = 0
+        with measure(self.__stage("export", "geopackage")) as metrics, geopackage_bulk_options():
+            for index, df in enumerate(self.frames(), start=part):
+                pyogrio.write_dataframe(df, geopackage_path, layer=layer_name, driver="GPKG", append=index > 0)
+                rows += len(df)
+        metrics.rows_in = rows
+        metrics.bytes_written = max(os.path.getsize(geopackage_path) - size_before, 0)
+        logger.info("Wrote %d rows to %s:%s in %.2fs", rows, geopackage_path, layer_name,
+                    time.perf_counter() - started)
 
-    def export_postgis(self, conn_str: str, layer_name: str):
-        engine = create_engine(conn_str)
-        self.df.to_postgis(layer_name, con=engine, if_exists='replace')
+    def export_parquet(self, layer_name: str, part: int = 0, partition_cols: list[str] = None,
+                       date_column: str = "date_time", row_group_size: int = default_row_group_size):
+        layer_dir = Path(f"data/{layer_name}")
+        if part == 0 and layer_dir.exists():
+            shutil.rmtree(layer_dir)
+        size_before = 0 if part == 0 else sum(path.stat().st_size for path in layer_dir.rglob("*.parquet"))
+        with measure(self.__stage("export", "parquet")) as metrics:
+            layer_dir.mkdir(parents=True, exist_ok=True)
+            file_options = pyarrow.dataset.ParquetFileFormat().make_write_options(compression="zstd",
+                                                                                  write_statistics=True)
+            for index, df in enumerate(self.frames(), start=part):
+                if partition_cols and "year" in partition_cols and "year" not in df.columns:
+                    df = df.assign(year=pandas.to_datetime(df[date_column]).dt.year)
+                table = geoparquet_table(df)
+                metrics.rows_in += len(table)
+                if index == 0:
+                    metadata = {**(table.schema.metadata or {}), b"partitioning": json.dumps(partition_cols or [])}
+                    pyarrow.parquet.write_metadata(table.schema.with_metadata(metadata), layer_dir / "_common_metadata")
+                pyarrow.dataset.write_dataset(table, layer_dir, format="parquet",
+                                              partitioning=partition_cols or None, partitioning_flavor="hive",
+                                              basename_template=f"{layer_name}-{index:05d}-{{i}}.parquet",
+                                              existing_data_behavior="overwrite_or_ignore",
+                                              max_rows_per_group=row_group_size,
+                                              min_rows_per_group=min(row_group_size, len(table)),
+                                              file_options=file_options)
+        metrics.bytes_written = sum(path.stat().st_size for path in layer_dir.rglob("*.parquet")) - size_before
 
+    def export_postgis(self, layer_name: str, role: EngineRole = EngineRole.READ_WRITE, part: int = 0,
+                       method: PostgisLoadMethod = PostgisLoadMethod.INSERT, delete_missing: bool = False):
+        started = time.perf_counter()
+        appending = method == PostgisLoadMethod.INCREMENTAL or part > 0
+        size_before = relation_size(layer_name, role) if appending else 0
+        metrics = self.__stage("export", f"postgis_{method.name.lower()}")
+        with measure(metrics):
+            rows = write_postgis(self.frames(), layer_name, role, part, method, delete_missing)
+        metrics.rows_in = rows
+        metrics.bytes_written = max(relation_size(layer_name, role) - size_before, 0)
+        elapsed = time.perf_counter() - started
+        logger.info("Loaded %d rows into %s with %s in %.2fs (%.0f rows/s)", rows, layer_name, method.name, elapsed,
+                    rows / elapsed if elapsed > 0 else 0)
+        query_cache.invalidate(layer_name)
@@ -0,0 +1,145 @@
+import json
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Union
+
+import geopandas
+import pandas
+import pyarrow
+import pyarrow.dataset
+import pyarrow.ipc
+import pyarrow.parquet
+import pyogrio
+import shapely
+from pyogrio.raw import open_arrow
+
+default_batch_size = 100_000
+default_row_group_size = 65_536
+
+geopackage_config_options = {
+    "OGR_SQLITE_SYNCHRONOUS": "OFF",
+    "OGR_SQLITE_CACHE": "512"
+}
+
+
+def arrow_to_frame(data: Union[pyarrow.Table, pyarrow.RecordBatch], geometry_name: str, crs=None) \
+        -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
+    if geometry_name not in data.column_names:
+        return data.to_pandas()
+    df = data.drop([geometry_name]).to_pandas() if isinstance(data, pyarrow.Table) \
+        else pyarrow.Table.from_batches([data]).drop([geometry_name]).to_pandas()
+    geometry = shapely.from_wkb(data.column(geometry_name).to_numpy(zero_copy_only=False))
+    return geopandas.GeoDataFrame(df, geometry=geopandas.GeoSeries(geometry, index=df.index, crs=crs))
+
+
+def read_geopackage(db_path: str, sql: str, crs=None, bbox: tuple[float, float, float, float] = None) \
+        -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
+    with open_arrow(db_path, sql=sql, bbox=bbox) as (meta, reader):
+        if not isinstance(reader, pyarrow.RecordBatchReader):
+            reader = pyarrow.RecordBatchReader.from_stream(reader)
+        return arrow_to_frame(reader.read_all(), meta["geometry_name"] or "wkb_geometry", crs or meta["crs"])
+
+
+def read_geopackage_batches(db_path: str, sql: str, batch_size: int = default_batch_size, crs=None) \
+        -> Iterator[Union[geopandas.GeoDataFrame, pandas.DataFrame]]:
+    with open_arrow(db_path, sql=sql, batch_size=batch_size) as (meta, reader):
+        if not isinstance(reader, pyarrow.RecordBatchReader):
+            reader = pyarrow.RecordBatchReader.from_stream(reader)
+        geometry_name = meta["geometry_name"] or "wkb_geometry"
+        for batch in reader:
+            yield arrow_to_frame(batch, geometry_name, crs or meta["crs"])
+
+
+def geoparquet_table(df: Union[geopandas.GeoDataFrame, pandas.DataFrame], preserve_index: bool = False) \
+        -> pyarrow.Table:
+    if not isinstance(df, geopandas.GeoDataFrame):
+        return pyarrow.Table.from_pandas(df, preserve_index=preserve_index)
+    geometry_name = df.geometry.name
+    bounds = df.geometry.bounds
+    frame = pandas.DataFrame(df.drop(columns=geometry_name))
+    frame[geometry_name] = shapely.to_wkb(df.geometry.to_numpy())
+    table = pyarrow.Table.from_pandas(frame, preserve_index=preserve_index)
+    table = table.append_column("bbox", pyarrow.StructArray.from_arrays(
+        [pyarrow.array(bounds[column], type=pyarrow.float64()) for column in ["minx", "miny", "maxx", "maxy"]],
+        names=["xmin", "ymin", "xmax", "ymax"]))
+    geo = {
+        "version": "1.1.0",
+        "primary_column": geometry_name,
+        "columns": {
+            geometry_name: {
+                "encoding": "WKB",
+                "geometry_types": sorted(set(df.geometry.geom_type.dropna())),
+                "crs": df.crs.to_json_dict() if df.crs is not None else None,
+                "bbox": [float(v) for v in df.geometry.total_bounds] if len(df) else None,
+                "covering": {"bbox": {key: ["bbox", key] for key in ["xmin", "ymin", "xmax", "ymax"]}}
+            }
+        }
+    }
+    return table.replace_schema_metadata({**(table.schema.metadata or {}), b"geo": json.dumps(geo).encode("utf-8")})
+
+
+def frame_to_ipc(df: Union[geopandas.GeoDataFrame, pandas.DataFrame]) -> bytes:
+    table = geoparquet_table(df, preserve_index=True)
+    table = table.replace_schema_metadata({**table.schema.metadata,
+                                          b"columns": json.dumps([str(c) for c in df.columns]).encode("utf-8")})
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def frame_from_ipc(payload: bytes) -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
+    table = pyarrow.ipc.open_stream(payload).read_all()
+    metadata = table.schema.metadata or {}
+    if b"geo" not in metadata:
+        return table.to_pandas()
+    geo = json.loads(metadata[b"geo"])
+    geometry_name = geo["primary_column"]
+    columns = json.loads(metadata[b"columns"])
+    df = arrow_to_frame(table.drop(["bbox"]), geometry_name, geo["columns"][geometry_name]["crs"])
+    return df[columns]
+
+
+def read_parquet(layer_name: str, filters: dict = None, columns: list[str] = None,
+                 bbox: tuple[float, float, float, float] = None) -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
+    layer_dir = Path(f"data/{layer_name}")
+    schema = pyarrow.parquet.read_schema(layer_dir / "_common_metadata")
+    partition_cols = json.loads(schema.metadata.get(b"partitioning", b"[]"))
+    partition_fields = [schema.field(c) for c in partition_cols]
+    partition_fields = [f.with_type(f.type.value_type) if pyarrow.types.is_dictionary(f.type) else f
+                        for f in partition_fields]
+    partitioning = pyarrow.dataset.partitioning(pyarrow.schema(partition_fields),
+                                                flavor="hive") if partition_cols else None
+    dataset = pyarrow.dataset.dataset(layer_dir, format="parquet", partitioning=partitioning)
+
+    expression = None
+    for column, value in (filters or {}).items():
+        condition = pyarrow.dataset.field(column).isin(value) if isinstance(value, (list, tuple, set)) \
+            else pyarrow.dataset.field(column) == value
+        expression = condition if expression is None else expression & condition
+    if bbox is not None:
+        xmin, ymin, xmax, ymax = bbox
+        condition = (pyarrow.dataset.field("bbox", "xmin") <= xmax) & (pyarrow.dataset.field("bbox", "xmax") >= xmin) \
+            & (pyarrow.dataset.field("bbox", "ymin") <= ymax) & (pyarrow.dataset.field("bbox", "ymax") >= ymin)
+        expression = condition if expression is None else expression & condition
+
+    df = dataset.to_table(columns=columns, filter=expression).to_pandas()
+    if b"geo" not in schema.metadata:
+        return df
+    geo = json.loads(schema.metadata[b"geo"])
+    geometry_name = geo["primary_column"]
+    if geometry_name not in df.columns:
+        return df.drop(columns="bbox", errors="ignore")
+    return geopandas.GeoDataFrame(df.drop(columns=[geometry_name, "bbox"], errors="ignore"),
+                                  geometry=geopandas.GeoSeries.from_wkb(df[geometry_name],
+                                                                        crs=geo["columns"][geometry_name]["crs"]))
+
+
+@contextmanager
+def geopackage_bulk_options():
+    previous = {option: pyogrio.get_gdal_config_option(option) for option in geopackage_config_options}
+    pyogrio.set_gdal_config_options(geopackage_config_options)
+    try:
+        yield
+    finally:
+        pyogrio.set_gdal_config_options(previous)
@@ -1,12 +1,12 @@
 import os
-from typing import Union
+from typing import Optional, Union
 
 import geopandas
 import pandas
 import shapely
-from shapely.wkt import loads
 
-from pipelines import Transformable, Queryable
+from pipelines import Transformable, Queryable, geopackage_stamp, intersecting
+from pipelines.arrow_io import read_geopackage
 
 geopandas.options.io_engine = "pyogrio"
 
@@ -74,22 +74,35 @@ class BioControlsQueryable(Queryable):
         """
 
     def query(self) -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
-        return geopandas.read_file(filename=self.db_path, sql=self.query_str)
+        return read_geopackage(self.db_path, self.query_str)
+
+    def source_stamp(self) -> Optional[str]:
+        return geopackage_stamp(self.db_path)
 
 
 class BioControlsTransformable(Transformable):
 
+    schema = {
+        "OBJECTID": "Int32",
+        "type": "category",
+        "is_water_quality_control": "boolean",
+        "is_flood_control": "boolean",
+        "is_subsurface_control": "boolean"
+    }
+
     def __init__(self, boundary_geometry: shapely.Geometry):
         self.boundary_geometry = boundary_geometry
 
     def transform(self, df: Union[geopandas.GeoDataFrame, pandas.DataFrame]) -> geopandas.GeoDataFrame:
-        df = geopandas.GeoDataFrame(df)
-        df.geometry = df['geometry'].apply(loads)
+        if not isinstance(df, geopandas.GeoDataFrame):
+            df = geopandas.GeoDataFrame(df, geometry=geopandas.GeoSeries.from_wkt(df['geometry']))
 
-        controls = geopandas.GeoDataFrame(df, geometry='geometry', crs="EPSG:4326")
+        xmin, ymin, xmax, ymax = geopandas.GeoSeries([self.boundary_geometry.envelope], crs="EPSG:26914") \
+            .to_crs("EPSG:4326").total_bounds
+        controls = df.set_crs("EPSG:4326", allow_override=True).cx[xmin:xmax, ymin:ymax]
         controls = controls.to_crs("EPSG:26914")
 
-        watershed_controls = controls[controls.intersects(self.boundary_geometry)]
+        watershed_controls = intersecting(controls, self.boundary_geometry)
         watershed_controls["type"].unique()
 
         vegetation_controls_list = ["Wildflower Meadow", "Grow Zone", "BIOFILTRATION", "RAIN_GARDEN",
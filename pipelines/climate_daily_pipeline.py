@@ -1,120 +1,44 @@
-import os
-from typing import Union
-from config import PostgresReadWriteConfig
-from sqlalchemy import create_engine
+from typing import Iterator, Optional, Union
+from config import AsyncEngines, EngineRole, get_engine
 import geopandas
 import pandas
 
-from pipelines import Transformable, Queryable
+from pipelines import Transformable, Queryable, default_batch_size, postgres_stamp, \
+    read_postgres_async, read_postgres_batches
+from pipelines.climate_unpivot import daily_columns, source_query, unpivot
 
 
 class ClimateDailyQueryable(Queryable):
 
     def __init__(self):
-        self.db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../data/staging.gpkg")
-
-        self.query_str = """
-            select encode((date_time || station_number || "parameter")::bytea, 'hex') as ckey,
-                   date_time,
-                   '-97.7604' as longitude, 
-                   '30.3208' as latitude,
-                   station_number,
-                   nullif(value, '') as value,
-                   "parameter"
-            from (SELECT r."DATE"                      as date_time,
-                         r."STATION"                 as station_number,
-                         r."DailyAverageDewPointTemperature" as value,
-                         'Dew Point Temperature'     as "parameter",
-                         r."REPORT_TYPE"
-                  FROM staging."NOAA_CM_Hourly" r
-                  union
-                  SELECT r."DATE"                      as date_time,
-                         r."STATION"                 as station_number,
-                         r."DailyAverageWetBulbTemperature" as value,
-                         'Wet Bulb Temperature'     as "parameter",
-                         r."REPORT_TYPE"
-                  FROM staging."NOAA_CM_Hourly" r
-                  union
-                  SELECT r."DATE"                      as date_time,
-                         r."STATION"                 as station_number,
-                         r."DailyAverageDryBulbTemperature" as value,
-                         'Dry Bulb Temperature'     as "parameter",
-                         r."REPORT_TYPE"
-                  FROM staging."NOAA_CM_Hourly" r
-                  union
-                  SELECT r."DATE"                      as date_time,
-                         r."STATION"                 as station_number,
-                         r."DailyAverageRelativeHumidity" as value,
-                         'Relative Humidity'      as "parameter",
-                         r."REPORT_TYPE"
-                  FROM staging."NOAA_CM_Hourly" r
-                  union
-                  SELECT r."DATE"                      as date_time,
-                         r."STATION"                 as station_number,
-                         r."DailyPrecipitation" as value,
-                         'Precipitation'      as "parameter",
-                         r."REPORT_TYPE"
-                  FROM staging."NOAA_CM_Hourly" r
-                  union
-                  SELECT r."DATE"                      as date_time,
-                         r."STATION"                 as station_number,
-                         r."DailyAverageWindSpeed" as value,
-                         'Average Wind Speed'      as "parameter",
-                         r."REPORT_TYPE"
-                  FROM staging."NOAA_CM_Hourly" r
-                  union
-                  SELECT r."DATE"                      as date_time,
-                         r."STATION"                 as station_number,
-                         r."DailySustainedWindDirection" as value,
-                         'Sustained Wind Direction'      as "parameter",
-                         r."REPORT_TYPE"
-                  FROM staging."NOAA_CM_Hourly" r
-                  union
-                  SELECT r."DATE"                      as date_time,
-                         r."STATION"                 as station_number,
-                         r."DailySustainedWindSpeed" as value,
-                         'Sustained Wind Speed'      as "parameter",
-                         r."REPORT_TYPE"
-                  FROM staging."NOAA_CM_Hourly" r
-                  union
-                  SELECT r."DATE"                      as date_time,
-                         r."STATION"                 as station_number,
-                         r."DailyPeakWindDirection" as value,
-                         'Peak Wind Direction'      as "parameter",
-                         r."REPORT_TYPE"
-                  FROM staging."NOAA_CM_Hourly" r
-                  union
-                  SELECT r."DATE"                      as date_time,
-                         r."STATION"                 as station_number,
-                         r."DailyPeakWindSpeed" as value,
-                         'Peak Wind Speed'      as "parameter",
-                         r."REPORT_TYPE"
-                  FROM staging."NOAA_CM_Hourly" r
-                  union
-                  SELECT r."DATE"                      as date_time,
-                         r."STATION"                 as station_number,
-                         r."DailyAverageSeaLevelPressure" as value,
-                         'Sea Level Pressure'      as "parameter",
-                         r."REPORT_TYPE"
-                  FROM staging."NOAA_CM_Hourly" r
-                  )
-            where "REPORT_TYPE" = 'SOD'
-              and value is not null
-          order by date_time
-        """
+        self.query_str = source_query('staging."NOAA_CM_Hourly"', daily_columns, 'SOD')
 
     def query(self) -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
-        conn_str = PostgresReadWriteConfig().__str__()
-        engine = create_engine(conn_str)
-        return pandas.read_sql_query(sql=self.query_str, con=engine)
+        return unpivot(pandas.read_sql_query(sql=self.query_str, con=get_engine(EngineRole.READ_ONLY)), daily_columns,
+                       strip_non_digits=False)
+
+    def query_batches(self, batch_size: int = default_batch_size) \
+            -> Iterator[Union[geopandas.GeoDataFrame, pandas.DataFrame]]:
+        for df in read_postgres_batches(self.query_str, EngineRole.READ_ONLY, batch_size):
+            yield unpivot(df, daily_columns, strip_non_digits=False)
+
+    async def query_async(self, engines: AsyncEngines) -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
+        df = await read_postgres_async(self.query_str, engines.get(EngineRole.READ_ONLY))
+        return unpivot(df, daily_columns, strip_non_digits=False)
+
+    def source_stamp(self) -> Optional[str]:
+        return postgres_stamp(["staging.NOAA_CM_Hourly"], EngineRole.READ_ONLY)
 
 
 class ClimateDailyTransformable(Transformable):
-    def transform(self, df: Union[geopandas.GeoDataFrame, pandas.DataFrame]) -> geopandas.GeoDataFrame:
-        df = geopandas.GeoDataFrame(df, geometry=geopandas.points_from_xy(x=df["longitude"], y=df["latitude"],
-                                                                            crs="EPSG:4326"))
+    schema = {
+        "station_number": "category",
+        "parameter": "category",
+        "value": "float32"
+    }
+
+    def transform(self, df: Union[geopandas.GeoDataFrame, pandas.DataFrame]) -> pandas.DataFrame:
+        df = pandas.DataFrame(df)
         df['date_time'] = pandas.to_datetime(df['date_time'])
         df['value'] = pandas.to_numeric(df['value'], errors='coerce')
-
-        climate = df.to_crs(crs="EPSG:26914")
-        return climate
+        return df
@@ -0,0 +1,66 @@
+from typing import Union
+
+import geopandas
+import pandas
+
+hourly_columns = {
+    "HourlyDewPointTemperature": "Dew Point Temperature",
+    "HourlyWetBulbTemperature": "Wet Bulb Temperature",
+    "HourlyDryBulbTemperature": "Dry Bulb Temperature",
+    "HourlyRelativeHumidity": "Relative Humidity",
+    "HourlyPrecipitation": "Precipitation",
+    "HourlyVisibility": "Hourly Visibility",
+    "HourlyWindDirection": "Wind Direction",
+    "HourlyWindSpeed": "Wind Speed",
+    "HourlyWindGustSpeed": "Wind Gust Speed",
+    "HourlySeaLevelPressure": "Sea Level Pressure"
+}
+
+daily_columns = {
+    "DailyAverageDewPointTemperature": "Dew Point Temperature",
+    "DailyAverageWetBulbTemperature": "Wet Bulb Temperature",
+    "DailyAverageDryBulbTemperature": "Dry Bulb Temperature",
+    "DailyAverageRelativeHumidity": "Relative Humidity",
+    "DailyPrecipitation": "Precipitation",
+    "DailyAverageWindSpeed": "Average Wind Speed",
+    "DailySustainedWindDirection": "Sustained Wind Direction",
+    "DailySustainedWindSpeed": "Sustained Wind Speed",
+    "DailyPeakWindDirection": "Peak Wind Direction",
+    "DailyPeakWindSpeed": "Peak Wind Speed",
+    "DailyAverageSeaLevelPressure": "Sea Level Pressure"
+}
+
+
+def source_query(table: str, columns: dict[str, str], report_type: str) -> str:
+    selected = ",\n                   ".join(f'r."{column}"' for column in columns)
+    return f"""
+            select r."DATE",
+                   r."STATION",
+                   {selected}
+            from {table} r
+            where r."REPORT_TYPE" = '{report_type}'
+            order by r."DATE"
+        """
+
+
+def unpivot(df: Union[geopandas.GeoDataFrame, pandas.DataFrame], columns: dict[str, str],
+            strip_non_digits: bool) -> pandas.DataFrame:
+    values = pandas.DataFrame(df[list(columns)]).astype("string").rename(columns=columns)
+    values["date_time"] = df["DATE"].astype("string")
+    values["station_number"] = df["STATION"].astype("string")
+    values["ckey"] = (values["date_time"] + values["station_number"]).str.encode("utf-8") \
+        .map(bytes.hex, na_action="ignore").astype("string")
+    long = values.melt(id_vars=["ckey", "date_time", "station_number"], var_name="parameter", value_name="value")
+
+    if strip_non_digits:
+        digits = long["value"].str.replace(r"[^0-9]+", "", regex=True).replace("", pandas.NA)
+        long["value"] = pandas.to_numeric(digits, errors="coerce").fillna(0.0)
+    else:
+        long["value"] = long["value"].replace("", pandas.NA)
+        long = long[long["value"].notna()]
+
+    parameter_keys = {parameter: parameter.encode("utf-8").hex() for parameter in columns.values()}
+    long["ckey"] = long["ckey"] + long["parameter"].map(parameter_keys).astype("string")
+    long = long[long["ckey"].isna() | ~long["ckey"].duplicated()]
+    long = long.sort_values("date_time", kind="stable", ignore_index=True)
+    return long[["ckey", "date_time", "station_number", "value", "parameter"]]
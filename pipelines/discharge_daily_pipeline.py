@@ -1,11 +1,11 @@
 import os
-from typing import Union
-from config import PostgresReadWriteConfig
-from sqlalchemy import create_engine
+from typing import Iterator, Optional, Union
+from config import AsyncEngines, EngineRole, get_engine
 import geopandas
 import pandas
 
-from pipelines import Transformable, Queryable
+from pipelines import Transformable, Queryable, default_batch_size, postgres_stamp, \
+    read_postgres_async, read_postgres_batches
 
 
 class DischargeDailyQueryable(Queryable):
@@ -17,8 +17,6 @@ class DischargeDailyQueryable(Queryable):
         select encode((date_time::timestamp || site_number || "parameter")::bytea, 'hex') as ckey,
                date_time,
                site_number,
-               s.dec_lat_va as latitude,
-               s.dec_long_va as longitude,
                "parameter",
                avg_value,
                max_value,
@@ -60,16 +58,34 @@ class DischargeDailyQueryable(Queryable):
         """
 
     def query(self) -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
-        conn_str = PostgresReadWriteConfig().__str__()
-        engine = create_engine(conn_str)
-        return pandas.read_sql_query(sql=self.query_str, con=engine)
+        return pandas.read_sql_query(sql=self.query_str, con=get_engine(EngineRole.READ_WRITE))
+
+    def query_batches(self, batch_size: int = default_batch_size) \
+            -> Iterator[Union[geopandas.GeoDataFrame, pandas.DataFrame]]:
+        return read_postgres_batches(self.query_str, EngineRole.READ_WRITE, batch_size)
+
+    async def query_async(self, engines: AsyncEngines) -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
+        return await read_postgres_async(self.query_str, engines.get(EngineRole.READ_WRITE))
+
+    def source_stamp(self) -> Optional[str]:
+        return postgres_stamp(["staging.NWIS_DV_08156675", "staging.NWIS_DV_08156800", "staging.NWIS_Sites"])
 
 
 class DischargeDailyTransformable(Transformable):
-    def transform(self, df: Union[geopandas.GeoDataFrame, pandas.DataFrame]) -> geopandas.GeoDataFrame:
+    schema = {
+        "site_number": "category",
+        "parameter": "category",
+        "avg_value": "float32",
+        "max_value": "float32",
+        "min_value": "float32",
+        "unit": "category",
+        "value_flag": "category"
+    }
+
+    def transform(self, df: Union[geopandas.GeoDataFrame, pandas.DataFrame]) -> pandas.DataFrame:
+        df = pandas.DataFrame(df)
         df['avg_value'] = pandas.to_numeric(df['avg_value'], errors='coerce')
         df['max_value'] = pandas.to_numeric(df['max_value'], errors='coerce')
         df['min_value'] = pandas.to_numeric(df['min_value'], errors='coerce')
         df['date_time'] = pandas.to_datetime(df['date_time'])
-        return geopandas.GeoDataFrame(df, geometry=geopandas.points_from_xy(x=df["longitude"], y=df["latitude"],
-                                                                            crs="EPSG:26914"))
+        return df
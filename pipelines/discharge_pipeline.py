@@ -1,10 +1,11 @@
 import os
-from typing import Union
+from typing import Iterator, Optional, Union
 
 import geopandas
 import pandas
 
-from pipelines import Transformable, Queryable
+from pipelines import Transformable, Queryable, default_batch_size, geopackage_stamp
+from pipelines.arrow_io import read_geopackage, read_geopackage_batches
 
 
 class DischargeQueryable(Queryable):
@@ -16,8 +17,6 @@ class DischargeQueryable(Queryable):
 select hex(CAST(strftime('%s', date_time) AS INT) || site_number || parameter) as ckey,
        (substr(date_time, 0, 11) || 'T' || substr(date_time, 12, 6)) as date_time,
        site_number,
-       s.dec_lat_va as latitude,
-       s.dec_long_va as longitude,
        parameter,
        primary_value,
        secondary_value,
@@ -87,13 +86,30 @@ select hex(CAST(strftime('%s', date_time) AS INT) || site_number || parameter) a
         """
 
     def query(self) -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
-        return geopandas.read_file(filename=self.db_path, sql=self.query_str)
+        return read_geopackage(self.db_path, self.query_str)
+
+    def query_batches(self, batch_size: int = default_batch_size) \
+            -> Iterator[Union[geopandas.GeoDataFrame, pandas.DataFrame]]:
+        return read_geopackage_batches(self.db_path, self.query_str, batch_size)
+
+    def source_stamp(self) -> Optional[str]:
+        return geopackage_stamp(self.db_path)
 
 
 class DischargeTransformable(Transformable):
-    def transform(self, df: Union[geopandas.GeoDataFrame, pandas.DataFrame]) -> geopandas.GeoDataFrame:
+    schema = {
+        "site_number": "category",
+        "parameter": "category",
+        "primary_value": "float32",
+        "secondary_value": "float32",
+        "unit": "category",
+        "primary_value_flag": "category",
+        "secondary_value_flag": "category"
+    }
+
+    def transform(self, df: Union[geopandas.GeoDataFrame, pandas.DataFrame]) -> pandas.DataFrame:
+        df = pandas.DataFrame(df)
         df['primary_value'] = pandas.to_numeric(df['primary_value'], errors='coerce').fillna(0.0)
         df['secondary_value'] = pandas.to_numeric(df['secondary_value'], errors='coerce').fillna(0.0)
         df['date_time'] = pandas.to_datetime(df['date_time'])
-        return geopandas.GeoDataFrame(df, geometry=geopandas.points_from_xy(x=df["longitude"], y=df["latitude"],
-                                                                            crs="EPSG:26914"))
+        return df
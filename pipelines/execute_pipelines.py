@@ -1,134 +1,151 @@
-from config import PostgresReadWriteConfig
-from pipelines import Pipeline
+import os
+import time
+
+import geopandas
+
+from config import RunReportConfig
+from pipelines import Pipeline, PostgisLoadMethod
 from pipelines.bio_controls_pipeline import BioControlsQueryable, BioControlsTransformable
 from pipelines.climate_daily_pipeline import ClimateDailyQueryable, ClimateDailyTransformable
 from pipelines.climate_hourly_pipeline import ClimateHourlyTransformable, ClimateHourlyQueryable
 from pipelines.discharge_daily_pipeline import DischargeDailyQueryable, DischargeDailyTransformable
 from pipelines.discharge_pipeline import DischargeQueryable, DischargeTransformable
 from pipelines.hydrography_pipeline import HydrographyQueryable, HydrographyTransformable
-from pipelines.water_quality_pipeline import WaterQualityQueryable, WaterQualityTransformable
+from pipelines.instrumentation import RunReport
+from pipelines.parallel import ParallelTransformable
+from pipelines.pipeline_dag import Dataset, GeoPackageSink, ParquetSink, PipelineDag, PostgisSink
+from pipelines.station_pipeline import ClimateStationsQueryable, ClimateStationsTransformable, \
+    DischargeSitesQueryable, DischargeSitesTransformable
+from pipelines.stream_corridor_pipeline import refresh_stream_corridor
+from pipelines.water_quality_pipeline import WaterQualityQueryable, WaterQualityTransformable, \
+    create_water_quality_indexes
 from pipelines.watershed_pipeline import WatershedQueryable, WatershedTransformable
 
+geopackage_path = "data/shoal-creek-wq-bio-mitigation.gpkg"
 
-def export_postgis():
-    cnx = PostgresReadWriteConfig().__str__()
+postgis_load_methods = {
+    'discharge': PostgisLoadMethod.INCREMENTAL,
+    'climate_hourly': PostgisLoadMethod.INCREMENTAL
+}
+
+file_layers = ['watershed', 'hydrography', 'discharge_sites', 'discharge', 'climate_stations', 'climate_hourly',
+               'water_quality', 'bio_controls']
+
+parquet_partitions = {
+    'discharge': ['site_number', 'parameter', 'year'],
+    'climate_hourly': ['parameter', 'year'],
+    'water_quality': ['canonical_parameter', 'year']
+}
+
+parquet_date_columns = {
+    'water_quality': 'sample_date_time'
+}
 
-    watershed_pipeline = Pipeline() \
-        .query(WatershedQueryable()) \
+
+def watershed_pipeline(pipeline: Pipeline) -> Pipeline:
+    return pipeline \
         .transform(WatershedTransformable())
 
-    watershed = watershed_pipeline.dataframe()
-    watershed_pipeline.export_postgis(conn_str=cnx, layer_name='watershed')
 
-    Pipeline() \
-        .query(HydrographyQueryable()) \
-        .transform(HydrographyTransformable(watershed.geometry[0])) \
-        .export_postgis(conn_str=cnx, layer_name='hydrography')
+def hydrography_pipeline(watershed: geopandas.GeoDataFrame) -> Pipeline:
+    return Pipeline() \
+        .query(HydrographyQueryable(watershed.geometry[0])) \
+        .transform(ParallelTransformable(HydrographyTransformable(watershed.geometry[0])))
 
-    Pipeline() \
-        .query(DischargeQueryable()) \
-        .transform(DischargeTransformable()) \
-        .export_postgis(conn_str=cnx, layer_name='discharge')
 
-    Pipeline() \
-        .query(ClimateHourlyQueryable()) \
-        .transform(ClimateHourlyTransformable()) \
-        .export_postgis(conn_str=cnx, layer_name='climate_hourly')
+def discharge_sites_pipeline() -> Pipeline:
+    return Pipeline() \
+        .query(DischargeSitesQueryable()) \
+        .transform(DischargeSitesTransformable())
 
-    Pipeline() \
-        .query(DischargeDailyQueryable()) \
-        .transform(DischargeDailyTransformable()) \
-        .export_postgis(conn_str=cnx, layer_name='discharge_daily')
 
-    Pipeline() \
-        .query(ClimateDailyQueryable()) \
-        .transform(ClimateDailyTransformable()) \
-        .export_postgis(conn_str=cnx, layer_name='climate_daily')
+def climate_stations_pipeline() -> Pipeline:
+    return Pipeline() \
+        .query(ClimateStationsQueryable()) \
+        .transform(ClimateStationsTransformable())
 
-    Pipeline() \
-        .query(WaterQualityQueryable()) \
-        .transform(WaterQualityTransformable(watershed.geometry[0])) \
-        .export_postgis(conn_str=cnx, layer_name='water_quality')
 
-    Pipeline() \
-        .query(BioControlsQueryable()) \
-        .transform(BioControlsTransformable(watershed.geometry[0])) \
-        .export_postgis(conn_str=cnx, layer_name='bio_controls')
+def discharge_pipeline() -> Pipeline:
+    return Pipeline() \
+        .stream(DischargeQueryable()) \
+        .transform(DischargeTransformable())
 
 
-def export_geopackage():
-    db_path = "data/shoal-creek-wq-bio-mitigation.gpkg"
-    watershed_pipeline = Pipeline() \
-        .query(WatershedQueryable()) \
-        .transform(WatershedTransformable())
+def climate_hourly_pipeline() -> Pipeline:
+    return Pipeline() \
+        .stream(ClimateHourlyQueryable()) \
+        .transform(ClimateHourlyTransformable())
+
+
+def discharge_daily_pipeline(pipeline: Pipeline) -> Pipeline:
+    return pipeline \
+        .transform(DischargeDailyTransformable())
 
-    watershed = watershed_pipeline.dataframe()
-    watershed_pipeline.export_geopackage(geopackage_path=db_path, layer_name='watershed')
 
-    Pipeline() \
-        .query(HydrographyQueryable()) \
-        .transform(HydrographyTransformable(watershed.geometry[0])) \
-        .export_geopackage(geopackage_path=db_path, layer_name='hydrography')
+def climate_daily_pipeline(pipeline: Pipeline) -> Pipeline:
+    return pipeline \
+        .transform(ClimateDailyTransformable())
 
-    Pipeline() \
-        .query(DischargeQueryable()) \
-        .transform(DischargeTransformable()) \
-        .export_geopackage(geopackage_path=db_path, layer_name='discharge')
 
-    Pipeline() \
-        .query(ClimateHourlyQueryable()) \
-        .transform(ClimateHourlyTransformable()) \
-        .export_geopackage(geopackage_path=db_path, layer_name='climate_hourly')
+def water_quality_pipeline(pipeline: Pipeline) -> Pipeline:
+    return pipeline \
+        .transform(WaterQualityTransformable())
 
-    Pipeline() \
-        .query(WaterQualityQueryable()) \
-        .transform(WaterQualityTransformable(watershed.geometry[0])) \
-        .export_geopackage(geopackage_path=db_path, layer_name='water_quality')
 
-    Pipeline() \
+def bio_controls_pipeline(watershed: geopandas.GeoDataFrame) -> Pipeline:
+    return Pipeline() \
         .query(BioControlsQueryable()) \
-        .transform(BioControlsTransformable(watershed.geometry[0])) \
-        .export_geopackage(geopackage_path=db_path, layer_name='bio_controls')
+        .transform(ParallelTransformable(BioControlsTransformable(watershed.geometry[0])))
 
 
-def export_parquet():
-    watershed_pipeline = Pipeline() \
-        .query(WatershedQueryable()) \
-        .transform(WatershedTransformable())
+dag = PipelineDag([
+    Dataset('watershed', watershed_pipeline, queryable=WatershedQueryable()),
+    Dataset('hydrography', hydrography_pipeline, depends_on=['watershed']),
+    Dataset('discharge_sites', discharge_sites_pipeline),
+    Dataset('climate_stations', climate_stations_pipeline),
+    Dataset('discharge', discharge_pipeline),
+    Dataset('climate_hourly', climate_hourly_pipeline),
+    Dataset('discharge_daily', discharge_daily_pipeline, queryable=DischargeDailyQueryable()),
+    Dataset('climate_daily', climate_daily_pipeline, queryable=ClimateDailyQueryable()),
+    Dataset('water_quality', water_quality_pipeline, queryable=WaterQualityQueryable()),
+    Dataset('bio_controls', bio_controls_pipeline, depends_on=['watershed'])
+])
 
-    watershed = watershed_pipeline.dataframe()
-    watershed_pipeline.export_parquet(layer_name='watershed')
 
-    Pipeline() \
-        .query(HydrographyQueryable()) \
-        .transform(HydrographyTransformable(watershed.geometry[0])) \
-        .export_parquet(layer_name='hydrography')
+def write_run_report(pipelines: dict[str, Pipeline], run_name: str):
+    config = RunReportConfig()
+    report = RunReport()
+    for name, pipeline in pipelines.items():
+        report.add(name, pipeline.stages)
+    report.write_json(os.path.join(config.report_dir, f"{run_name}-{time.strftime('%Y%m%dT%H%M%S')}.json"))
+    report.write_prometheus(config.prometheus_textfile)
 
-    Pipeline() \
-        .query(DischargeQueryable()) \
-        .transform(DischargeTransformable()) \
-        .export_parquet(layer_name='discharge')
 
-    Pipeline() \
-        .query(ClimateHourlyQueryable()) \
-        .transform(ClimateHourlyTransformable()) \
-        .export_parquet(layer_name='climate_hourly')
+def export_postgis():
+    write_run_report(dag.run([PostgisSink(load_methods=postgis_load_methods)]), "postgis")
+    create_water_quality_indexes()
+    refresh_stream_corridor()
 
-    Pipeline() \
-        .query(WaterQualityQueryable()) \
-        .transform(WaterQualityTransformable(watershed.geometry[0])) \
-        .export_parquet(layer_name='water_quality')
 
-    Pipeline() \
-        .query(BioControlsQueryable()) \
-        .transform(BioControlsTransformable(watershed.geometry[0])) \
-        .export_parquet(layer_name='bio_controls')
+def export_geopackage():
+    write_run_report(dag.run([GeoPackageSink(geopackage_path)], names=file_layers), "geopackage")
 
 
-if __name__ == '__main__':
-    cnx = PostgresReadWriteConfig().__str__()
+def export_parquet():
+    write_run_report(dag.run([ParquetSink(partitions=parquet_partitions, date_columns=parquet_date_columns)],
+                             names=file_layers), "parquet")
+
+
+def export_all():
+    write_run_report(dag.run([PostgisSink(load_methods=postgis_load_methods),
+                              GeoPackageSink(geopackage_path, layers=file_layers),
+                              ParquetSink(layers=file_layers, partitions=parquet_partitions,
+                                          date_columns=parquet_date_columns)]), "all")
+    create_water_quality_indexes()
+    refresh_stream_corridor()
 
-    Pipeline() \
-        .query(WaterQualityQueryable()) \
-        .transform(WaterQualityTransformable()) \
-        .export_postgis(conn_str=cnx, layer_name='water_quality')
+
+if __name__ == '__main__':
+    dag.run([PostgisSink()], names=['water_quality'])
+    create_water_quality_indexes()
+    refresh_stream_corridor()
@@ -1,19 +1,20 @@
 import os
-from typing import Union
+from typing import Optional, Union
 
 import geopandas
 import pandas
 import shapely
-from shapely.wkt import loads
 
-from pipelines import Transformable, Queryable
+from pipelines import Transformable, Queryable, geopackage_stamp, intersecting
+from pipelines.arrow_io import read_geopackage
 
 geopandas.options.io_engine = "pyogrio"
 
 
 class HydrographyQueryable(Queryable):
 
-    def __init__(self):
+    def __init__(self, boundary_geometry: shapely.Geometry = None):
+        self.boundary_geometry = boundary_geometry
         self.db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../data/staging.gpkg")
 
         self.query_str = """
@@ -28,7 +29,12 @@ class HydrographyQueryable(Queryable):
         """
 
     def query(self) -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
-        return geopandas.read_file(filename=self.db_path, sql=self.query_str, crs="EPSG:26914")
+        bbox = self.boundary_geometry.bounds if self.boundary_geometry is not None else None
+        return read_geopackage(self.db_path, self.query_str, crs="EPSG:26914", bbox=bbox)
+
+    def source_stamp(self) -> Optional[str]:
+        bounds = self.boundary_geometry.bounds if self.boundary_geometry is not None else None
+        return f"{geopackage_stamp(self.db_path)}:{bounds}"
 
 
 class HydrographyTransformable(Transformable):
@@ -37,5 +43,4 @@ class HydrographyTransformable(Transformable):
         self.boundary_geometry = boundary_geometry
 
     def transform(self, df: Union[geopandas.GeoDataFrame, pandas.DataFrame]) -> geopandas.GeoDataFrame:
-        flow_lines = geopandas.GeoDataFrame.copy(df)
-        return flow_lines[flow_lines.intersects(self.boundary_geometry)]
+        return intersecting(geopandas.GeoDataFrame(df), self.boundary_geometry)
@@ -0,0 +1,148 @@
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Union
+
+import geopandas
+import pandas
+import psutil
+from prometheus_client import CollectorRegistry, Gauge, write_to_textfile
+
+
+class StageMetrics:
+
+    def __init__(self, stage: str, name: str):
+        self.stage = stage
+        self.name = name
+        self.seconds = 0.0
+        self.rows_in = 0
+        self.rows_out = 0
+        self.bytes_written = 0
+        self.peak_rss_bytes = 0
+
+
+class RssSampler:
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.lock = threading.Lock()
+        self.peaks = {}
+        self.next_key = 0
+        self.thread = None
+
+    @contextmanager
+    def track(self, metrics: StageMetrics):
+        with self.lock:
+            key = self.next_key
+            self.next_key += 1
+            self.peaks[key] = self.process.memory_info().rss
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.__sample, daemon=True)
+                self.thread.start()
+        try:
+            yield
+        finally:
+            rss = self.process.memory_info().rss
+            with self.lock:
+                peak = max(self.peaks.pop(key), rss)
+            metrics.peak_rss_bytes = max(metrics.peak_rss_bytes, peak)
+
+    def __sample(self):
+        while True:
+            rss = self.process.memory_info().rss
+            with self.lock:
+                if not self.peaks:
+                    self.thread = None
+                    return
+                for key in self.peaks:
+                    self.peaks[key] = max(self.peaks[key], rss)
+            time.sleep(self.interval)
+
+
+rss_sampler = RssSampler()
+active_stages = contextvars.ContextVar("active_stages", default=())
+
+
+@contextmanager
+def measure(metrics: StageMetrics):
+    parents = active_stages.get()
+    frame = [0.0]
+    token = active_stages.set(parents + (frame,))
+    started = time.perf_counter()
+    try:
+        with rss_sampler.track(metrics):
+            yield metrics
+    finally:
+        elapsed = time.perf_counter() - started
+        active_stages.reset(token)
+        metrics.seconds += elapsed - frame[0]
+        if parents:
+            parents[-1][0] += elapsed
+
+
+def measured_batches(metrics: StageMetrics, batches: Iterator[Union[geopandas.GeoDataFrame, pandas.DataFrame]]) \
+        -> Iterator[Union[geopandas.GeoDataFrame, pandas.DataFrame]]:
+    iterator = iter(batches)
+    while True:
+        with measure(metrics):
+            try:
+                df = next(iterator)
+            except StopIteration:
+                return
+        metrics.rows_out += len(df)
+        yield df
+
+
+class RunReport:
+
+    def __init__(self):
+        self.started = time.time()
+        self.stages = {}
+
+    def add(self, layer_name: str, stages: list[StageMetrics]):
+        for stage in stages:
+            key = (layer_name, stage.stage, stage.name)
+            total = self.stages.setdefault(key, StageMetrics(stage.stage, stage.name))
+            total.seconds += stage.seconds
+            total.rows_in += stage.rows_in
+            total.rows_out += stage.rows_out
+            total.bytes_written += stage.bytes_written
+            total.peak_rss_bytes = max(total.peak_rss_bytes, stage.peak_rss_bytes)
+
+    def as_dict(self) -> dict:
+        return {
+            "started": self.started,
+            "finished": time.time(),
+            "stages": [{"layer": layer_name, **vars(stage)} for (layer_name, _, _), stage in self.stages.items()]
+        }
+
+    def write_json(self, path: Union[str, Path]):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(json.dumps(self.as_dict(), indent=2))
+
+    def write_prometheus(self, path: Union[str, Path]):
+        registry = CollectorRegistry()
+        labels = ["layer", "stage", "name"]
+        gauges = {
+            "seconds": Gauge("shoalcreek_pipeline_stage_seconds", "Wall time spent in the stage", labels,
+                             registry=registry),
+            "rows_in": Gauge("shoalcreek_pipeline_stage_rows_in", "Rows passed into the stage", labels,
+                             registry=registry),
+            "rows_out": Gauge("shoalcreek_pipeline_stage_rows_out", "Rows produced by the stage", labels,
+                              registry=registry),
+            "bytes_written": Gauge("shoalcreek_pipeline_stage_bytes_written", "Bytes written by the stage", labels,
+                                   registry=registry),
+            "peak_rss_bytes": Gauge("shoalcreek_pipeline_stage_peak_rss_bytes", "Peak resident memory during the stage",
+                                    labels, registry=registry)
+        }
+        for (layer_name, stage_name, name), stage in self.stages.items():
+            for attribute, gauge in gauges.items():
+                gauge.labels(layer=layer_name, stage=stage_name, name=name).set(getattr(stage, attribute))
+        Gauge("shoalcreek_pipeline_last_run_timestamp_seconds", "Start time of the last pipeline run",
+              registry=registry).set(self.started)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        write_to_textfile(str(path), registry)
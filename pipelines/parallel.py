@@ -0,0 +1,50 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union
+
+import geopandas
+import pandas
+
+from config import ParallelTransformConfig
+from pipelines import Transformable
+from pipelines.arrow_io import frame_from_ipc, frame_to_ipc
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    with _pools_lock:
+        if max_workers not in _pools:
+            _pools[max_workers] = ProcessPoolExecutor(max_workers=max_workers,
+                                                      mp_context=multiprocessing.get_context("spawn"))
+        return _pools[max_workers]
+
+
+def transform_chunk(transformable: Transformable, payload: bytes) -> bytes:
+    return frame_to_ipc(transformable.transform(frame_from_ipc(payload)))
+
+
+class ParallelTransformable(Transformable):
+
+    def __init__(self, transformable: Transformable, max_workers: int = None, min_rows: int = None):
+        config = ParallelTransformConfig()
+        self.transformable = transformable
+        self.max_workers = max_workers or config.max_workers
+        self.min_rows = min_rows if min_rows is not None else config.min_rows
+        self.schema = transformable.schema
+
+    def transform(self, df: Union[geopandas.GeoDataFrame, pandas.DataFrame]) \
+            -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
+        if self.max_workers <= 1 or len(df) < self.min_rows:
+            return self.transformable.transform(df)
+        chunk_size = -(-len(df) // self.max_workers)
+        payloads = [frame_to_ipc(df.iloc[start:start + chunk_size]) for start in range(0, len(df), chunk_size)]
+        pool = get_process_pool(self.max_workers)
+        results = [frame_from_ipc(payload) for payload in
+                   pool.map(transform_chunk, [self.transformable] * len(payloads), payloads)]
+        result = pandas.concat(results)
+        if isinstance(results[0], geopandas.GeoDataFrame):
+            result = geopandas.GeoDataFrame(result, geometry=results[0].geometry.name, crs=results[0].crs)
+        return result
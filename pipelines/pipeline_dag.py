@@ -0,0 +1,141 @@
+import threading
+from abc import ABC
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable
+
+from config import EngineRole
+from pipelines import Pipeline, PostgisLoadMethod, Queryable
+from pipelines.postgis_loader import delete_vanished_keys
+
+
+class Sink(ABC):
+
+    def __init__(self, layers: list[str] = None):
+        self.layers = layers
+
+    def accepts(self, layer_name: str) -> bool:
+        return self.layers is None or layer_name in self.layers
+
+    def write(self, pipeline: Pipeline, layer_name: str, part: int = 0):
+        pass
+
+    def finish(self, layer_name: str):
+        pass
+
+
+class PostgisSink(Sink):
+
+    def __init__(self, role: EngineRole = EngineRole.READ_WRITE, layers: list[str] = None,
+                 load_methods: dict[str, PostgisLoadMethod] = None, delete_missing: list[str] = None):
+        super().__init__(layers)
+        self.role = role
+        self.load_methods = load_methods or {}
+        self.delete_missing = delete_missing or []
+
+    def write(self, pipeline: Pipeline, layer_name: str, part: int = 0):
+        pipeline.export_postgis(layer_name=layer_name, role=self.role, part=part,
+                                method=self.load_methods.get(layer_name, PostgisLoadMethod.INSERT),
+                                delete_missing=self.__deletes_missing(layer_name))
+
+    def finish(self, layer_name: str):
+        if self.__deletes_missing(layer_name):
+            delete_vanished_keys(layer_name, self.role)
+
+    def __deletes_missing(self, layer_name: str) -> bool:
+        return self.load_methods.get(layer_name) == PostgisLoadMethod.INCREMENTAL and layer_name in self.delete_missing
+
+
+class GeoPackageSink(Sink):
+
+    def __init__(self, geopackage_path: str, layers: list[str] = None):
+        super().__init__(layers)
+        self.geopackage_path = geopackage_path
+        self.lock = threading.Lock()
+
+    def write(self, pipeline: Pipeline, layer_name: str, part: int = 0):
+        with self.lock:
+            pipeline.export_geopackage(geopackage_path=self.geopackage_path, layer_name=layer_name, part=part)
+
+
+class ParquetSink(Sink):
+
+    def __init__(self, layers: list[str] = None, partitions: dict[str, list[str]] = None,
+                 date_columns: dict[str, str] = None):
+        super().__init__(layers)
+        self.partitions = partitions or {}
+        self.date_columns = date_columns or {}
+
+    def write(self, pipeline: Pipeline, layer_name: str, part: int = 0):
+        pipeline.export_parquet(layer_name=layer_name, part=part, partition_cols=self.partitions.get(layer_name),
+                                date_column=self.date_columns.get(layer_name, "date_time"))
+
+
+class Dataset:
+
+    def __init__(self, name: str, build: Callable[..., Pipeline], depends_on: list[str] = None,
+                 queryable: Queryable = None):
+        self.name = name
+        self.build = build
+        self.depends_on = depends_on or []
+        self.queryable = queryable
+
+
+class PipelineDag:
+
+    def __init__(self, datasets: list[Dataset]):
+        self.datasets = {dataset.name: dataset for dataset in datasets}
+        for dataset in datasets:
+            for dependency in dataset.depends_on:
+                if dependency not in self.datasets:
+                    raise ValueError(f'Dataset {dataset.name} depends on unknown dataset {dependency}')
+
+    def run(self, sinks: list[Sink], names: list[str] = None, max_workers: int = 4) -> dict[str, Pipeline]:
+        pending = self.__with_dependencies(names or list(self.datasets))
+        queryables = {name: self.datasets[name].queryable for name in pending
+                      if self.datasets[name].queryable is not None}
+        extracted = Pipeline.gather(queryables) if queryables else {}
+        completed = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            running = {}
+            while pending or running:
+                for name in [n for n in pending if all(d in completed for d in self.datasets[n].depends_on)]:
+                    pending.remove(name)
+                    running[executor.submit(self.__run_dataset, self.datasets[name], completed, sinks,
+                                            extracted.get(name))] = name
+                if not running:
+                    raise ValueError(f'Datasets {pending} have cyclic dependencies')
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    completed[running.pop(future)] = future.result()
+        return completed
+
+    def __with_dependencies(self, names: list[str]) -> list[str]:
+        selected = []
+        stack = list(names)
+        while stack:
+            name = stack.pop()
+            if name not in selected:
+                selected.append(name)
+                stack.extend(self.datasets[name].depends_on)
+        return selected
+
+    @staticmethod
+    def __run_dataset(dataset: Dataset, completed: dict[str, Pipeline], sinks: list[Sink],
+                      extracted: Pipeline = None) -> Pipeline:
+        dependencies = {name: completed[name].dataframe() for name in dataset.depends_on}
+        if extracted is not None:
+            dependencies["pipeline"] = extracted
+        pipeline = dataset.build(**dependencies)
+        accepting = [sink for sink in sinks if sink.accepts(dataset.name)]
+        if pipeline.is_streaming() and len(accepting) > 1:
+            for part, batch in enumerate(pipeline.frames()):
+                for sink in accepting:
+                    part_pipeline = Pipeline.of(batch)
+                    sink.write(part_pipeline, dataset.name, part=part)
+                    pipeline.stages.extend(part_pipeline.stages)
+        else:
+            for sink in accepting:
+                sink.write(pipeline, dataset.name)
+        for sink in accepting:
+            sink.finish(dataset.name)
+        return pipeline
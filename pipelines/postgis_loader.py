@@ -0,0 +1,201 @@
+import io
+import logging
+from enum import Enum
+from typing import Iterator, Union
+
+import geopandas
+import pandas
+import shapely
+from sqlalchemy import inspect, text
+
+import query_cache
+from config import EngineRole, get_engine
+
+logger = logging.getLogger(__name__)
+
+copy_chunk_size = 100_000
+copy_null = "\\N"
+
+
+class PostgisLoadMethod(Enum):
+    INSERT = 1
+    COPY = 2
+    INCREMENTAL = 3
+
+
+def with_row_hash(df: Union[geopandas.GeoDataFrame, pandas.DataFrame]) \
+        -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
+    content = pandas.DataFrame(df.drop(columns=["ckey", "row_hash"], errors="ignore"))
+    if isinstance(df, geopandas.GeoDataFrame):
+        content[df.geometry.name] = shapely.to_wkb(df.geometry.to_numpy())
+    return df.assign(row_hash=pandas.util.hash_pandas_object(content, index=False).to_numpy().view("int64"))
+
+
+def delete_vanished_keys(layer_name: str, role: EngineRole = EngineRole.READ_WRITE) -> int:
+    with get_engine(role).begin() as conn:
+        deleted = conn.exec_driver_sql(f'delete from public."{layer_name}" t where not exists '
+                                       f'(select 1 from public."{layer_name}_seen" s where s.ckey = t.ckey)').rowcount
+        conn.exec_driver_sql(f'drop table public."{layer_name}_seen"')
+    logger.info("Deleted %d vanished keys from %s", deleted, layer_name)
+    query_cache.invalidate(layer_name)
+    return deleted
+
+
+def relation_size(layer_name: str, role: EngineRole) -> int:
+    with get_engine(role).connect() as conn:
+        return conn.execute(text("select coalesce(pg_total_relation_size(to_regclass(:table)), 0)"),
+                            {"table": f'public."{layer_name}"'}).scalar()
+
+
+def write_postgis(frames: Iterator[Union[geopandas.GeoDataFrame, pandas.DataFrame]], layer_name: str,
+                  role: EngineRole, part: int, method: PostgisLoadMethod, delete_missing: bool) -> int:
+    if method == PostgisLoadMethod.COPY:
+        rows = copy_postgis(layer_name, role, part, frames)
+    elif method == PostgisLoadMethod.INCREMENTAL:
+        inserted, updated = merge_postgis(frames, layer_name, role, part, delete_missing)
+        logger.info("Merged into %s: %d inserted, %d updated", layer_name, inserted, updated)
+        rows = inserted + updated
+    else:
+        rows = 0
+        for index, df in enumerate(frames, start=part):
+            if isinstance(df, geopandas.GeoDataFrame):
+                df.to_postgis(layer_name, con=get_engine(role), if_exists='replace' if index == 0 else 'append')
+            else:
+                df.to_sql(layer_name, con=get_engine(role), if_exists='replace' if index == 0 else 'append',
+                          index=False)
+            rows += len(df)
+    return rows
+
+
+def copy_postgis(layer_name: str, role: EngineRole, part: int,
+                 frames: Iterator[Union[geopandas.GeoDataFrame, pandas.DataFrame]]) -> int:
+    engine = get_engine(role)
+    table = f"{layer_name}_load" if part == 0 else layer_name
+    rows = 0
+    geometry_column = None
+    connection = engine.raw_connection()
+    try:
+        for index, df in enumerate(frames):
+            if isinstance(df, geopandas.GeoDataFrame):
+                geometry_column = df.geometry.name
+            if index == 0 and part == 0:
+                create_load_table(df.head(0), table, engine)
+            rows += copy_frame(connection, df, table)
+        if part == 0:
+            with connection.cursor() as cursor:
+                cursor.execute(f'drop table if exists public."{layer_name}"')
+                cursor.execute(f'alter table public."{table}" rename to "{layer_name}"')
+                if geometry_column is not None:
+                    cursor.execute(f'create index "idx_{layer_name}_{geometry_column}" '
+                                   f'on public."{layer_name}" using gist ("{geometry_column}")')
+                cursor.execute(f'analyze public."{layer_name}"')
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return rows
+
+
+def merge_postgis(frames: Iterator[Union[geopandas.GeoDataFrame, pandas.DataFrame]], layer_name: str,
+                  role: EngineRole, part: int, delete_missing: bool) -> tuple[int, int]:
+    engine = get_engine(role)
+    if part == 0 and delete_missing:
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f'drop table if exists public."{layer_name}_seen"')
+            conn.exec_driver_sql(f'create table public."{layer_name}_seen" (ckey text)')
+    frames = (with_row_hash(df.drop_duplicates(subset="ckey", keep="last")) for df in frames)
+    if delete_missing:
+        frames = record_keys(frames, layer_name, engine)
+
+    columns = {c["name"] for c in inspect(engine).get_columns(layer_name, schema="public")} \
+        if inspect(engine).has_table(layer_name, schema="public") else set()
+    if part == 0 and "row_hash" not in columns:
+        inserted = copy_postgis(layer_name, role, part, frames)
+        updated = 0
+    else:
+        inserted, updated = 0, 0
+        for df in frames:
+            new, changed = merge_frame(df, layer_name, engine)
+            inserted += new
+            updated += changed
+    with engine.begin() as conn:
+        if conn.execute(text("select to_regclass(:index) is null"),
+                        {"index": f'public."uq_{layer_name}_ckey"'}).scalar():
+            conn.exec_driver_sql(f'delete from public."{layer_name}" a using public."{layer_name}" b '
+                                 f'where a.ckey = b.ckey and a.ctid < b.ctid')
+            conn.exec_driver_sql(f'drop index if exists public."idx_{layer_name}_ckey"')
+            conn.exec_driver_sql(f'create unique index "uq_{layer_name}_ckey" on public."{layer_name}" (ckey)')
+    return inserted, updated
+
+
+def record_keys(frames: Iterator[Union[geopandas.GeoDataFrame, pandas.DataFrame]], layer_name: str,
+                engine) -> Iterator[Union[geopandas.GeoDataFrame, pandas.DataFrame]]:
+    for df in frames:
+        connection = engine.raw_connection()
+        try:
+            copy_frame(connection, df[["ckey"]], f"{layer_name}_seen")
+            connection.commit()
+        finally:
+            connection.close()
+        yield df
+
+
+def merge_frame(df: Union[geopandas.GeoDataFrame, pandas.DataFrame], layer_name: str, engine) -> tuple[int, int]:
+    increment = f"{layer_name}_increment"
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'create temp table "{layer_name}_incoming" (ckey text, row_hash bigint) on commit drop')
+            copy_frame(connection, df[["ckey", "row_hash"]], f"{layer_name}_incoming", schema=None)
+            cursor.execute(f'select distinct i.ckey, t.ckey is not null from "{layer_name}_incoming" i '
+                           f'left join public."{layer_name}" t on t.ckey = i.ckey '
+                           f'where t.ckey is null or t.row_hash is distinct from i.row_hash')
+            existing = dict(cursor.fetchall())
+        changed = df[df["ckey"].isin(existing.keys())]
+        if len(changed) == 0:
+            connection.rollback()
+            return 0, 0
+        with connection.cursor() as cursor:
+            cursor.execute(f'create temp table "{increment}" (like public."{layer_name}") on commit drop')
+        copy_frame(connection, changed, increment, schema=None)
+        columns = ','.join(f'"{c}"' for c in changed.columns)
+        with connection.cursor() as cursor:
+            cursor.execute(f'delete from public."{layer_name}" t using "{increment}" i where t.ckey = i.ckey')
+            cursor.execute(f'insert into public."{layer_name}" ({columns}) select {columns} from "{increment}"')
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    updated = int(changed["ckey"].map(existing).sum())
+    return len(changed) - updated, updated
+
+
+def create_load_table(empty: Union[geopandas.GeoDataFrame, pandas.DataFrame], table: str, engine):
+    if isinstance(empty, geopandas.GeoDataFrame):
+        empty.to_postgis(table, con=engine, if_exists='replace')
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f'drop index if exists public."idx_{table}_{empty.geometry.name}"')
+    else:
+        empty.to_sql(table, con=engine, if_exists='replace', index=False)
+
+
+def copy_frame(connection, df: Union[geopandas.GeoDataFrame, pandas.DataFrame], table: str,
+               chunk_size: int = copy_chunk_size, schema: str = "public") -> int:
+    target = f'{schema}."{table}"' if schema else f'"{table}"'
+    columns = ','.join(f'"{c}"' for c in df.columns)
+    with connection.cursor() as cursor:
+        for start in range(0, len(df), chunk_size):
+            chunk = pandas.DataFrame(df.iloc[start:start + chunk_size])
+            if isinstance(df, geopandas.GeoDataFrame):
+                geometries = shapely.set_srid(df.geometry.iloc[start:start + chunk_size].to_numpy(),
+                                              df.crs.to_epsg() if df.crs is not None else 0)
+                chunk[df.geometry.name] = shapely.to_wkb(geometries, hex=True, include_srid=True)
+            buffer = io.StringIO()
+            chunk.to_csv(buffer, index=False, header=False, na_rep=copy_null)
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {target} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{copy_null}')", buffer)
+    return len(df)
@@ -0,0 +1,77 @@
+import os
+from typing import Optional, Union
+
+import geopandas
+import pandas
+
+from config import EngineRole, get_engine
+from pipelines import Transformable, Queryable, geopackage_stamp, postgres_stamp
+from pipelines.arrow_io import read_geopackage
+
+
+def station_query(table: str) -> str:
+    return f"""
+        select r."STATION" as station_number,
+               max(r."LATITUDE") as latitude,
+               max(r."LONGITUDE") as longitude
+        from {table} r
+        group by r."STATION"
+        order by r."STATION"
+        """
+
+
+class ClimateStationsQueryable(Queryable):
+
+    def __init__(self):
+        self.db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../data/staging.gpkg")
+
+        self.query_str = station_query('staging."3675312"')
+        self.daily_query_str = station_query('staging."NOAA_CM_Hourly"')
+
+    def query(self) -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
+        hourly = pandas.DataFrame(read_geopackage(self.db_path, self.query_str))
+        daily = pandas.read_sql_query(sql=self.daily_query_str, con=get_engine(EngineRole.READ_ONLY))
+        stations = pandas.concat([hourly, daily], ignore_index=True)
+        return stations.drop_duplicates(subset="station_number").sort_values("station_number", ignore_index=True)
+
+    def source_stamp(self) -> Optional[str]:
+        return f'{geopackage_stamp(self.db_path)}|{postgres_stamp(["staging.NOAA_CM_Hourly"], EngineRole.READ_ONLY)}'
+
+
+class ClimateStationsTransformable(Transformable):
+    def transform(self, df: Union[geopandas.GeoDataFrame, pandas.DataFrame]) -> geopandas.GeoDataFrame:
+        df = pandas.DataFrame(df).assign(longitude=pandas.to_numeric(df["longitude"]),
+                                         latitude=pandas.to_numeric(df["latitude"]))
+        stations = geopandas.GeoDataFrame(df, geometry=geopandas.points_from_xy(x=df["longitude"], y=df["latitude"],
+                                                                                crs="EPSG:4326"))
+        return stations.to_crs(crs="EPSG:26914")
+
+
+class DischargeSitesQueryable(Queryable):
+
+    def __init__(self):
+        self.db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../data/staging.gpkg")
+
+        self.query_str = """
+        select s.site_no as site_number,
+               s.dec_lat_va as latitude,
+               s.dec_long_va as longitude
+        from NWIS_Sites s
+        where s.site_no in ('08156800', '08156675')
+        order by s.site_no
+        """
+
+    def query(self) -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
+        return read_geopackage(self.db_path, self.query_str)
+
+    def source_stamp(self) -> Optional[str]:
+        return geopackage_stamp(self.db_path)
+
+
+class DischargeSitesTransformable(Transformable):
+    def transform(self, df: Union[geopandas.GeoDataFrame, pandas.DataFrame]) -> geopandas.GeoDataFrame:
+        df = pandas.DataFrame(df).assign(longitude=pandas.to_numeric(df["longitude"]),
+                                         latitude=pandas.to_numeric(df["latitude"]))
+        sites = geopandas.GeoDataFrame(df, geometry=geopandas.points_from_xy(x=df["longitude"], y=df["latitude"],
+                                                                             crs="EPSG:4326"))
+        return sites.to_crs(crs="EPSG:26914")
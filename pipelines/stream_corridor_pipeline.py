@@ -0,0 +1,36 @@
+from sqlalchemy import text
+
+import query_cache
+from config import EngineRole, get_engine
+
+stream_corridor_buffer = 25
+
+refresh_stream_corridor_query = f"""
+drop table if exists public.stream_corridor;
+
+create table public.stream_corridor
+as
+select ST_Buffer(ST_LineMerge(ST_Union(h.geometry)), {stream_corridor_buffer}) as geometry
+from public.hydrography h;
+
+create index stream_corridor_geometry_idx on public.stream_corridor using gist (geometry);
+
+create index if not exists water_quality_geometry_idx on public.water_quality using gist (geometry);
+
+alter table public.water_quality add column if not exists in_stream_corridor boolean not null default false;
+
+update public.water_quality wq
+set in_stream_corridor = exists (select 1 from public.stream_corridor c where ST_Intersects(wq.geometry, c.geometry));
+
+create index if not exists water_quality_in_stream_corridor_idx
+    on public.water_quality (canonical_parameter, sample_location, sample_date_time) where in_stream_corridor;
+
+analyze public.stream_corridor;
+analyze public.water_quality;
+"""
+
+
+def refresh_stream_corridor():
+    with get_engine(EngineRole.READ_WRITE).begin() as conn:
+        conn.execute(text(refresh_stream_corridor_query))
+    query_cache.invalidate("water_quality")
@@ -1,25 +1,29 @@
 from __future__ import annotations
 
 import os
-from typing import Union
+from typing import Optional, Union
 
 import geopandas
 import pandas
-import shapely
-from sqlalchemy import create_engine
+from sqlalchemy import text
 
-from config import PostgresReadWriteConfig
-from pipelines import Queryable, Transformable
+from config import AsyncEngines, EngineRole, get_engine
+from pipelines import Queryable, Transformable, postgres_stamp, read_postgres_async
+from water_quality_parameters import parameter_aliases, units
 
 geopandas.options.io_engine = "pyogrio"
 
+water_quality_indexes_query = """
+create index if not exists water_quality_canonical_parameter_idx
+    on public.water_quality (canonical_parameter, sample_location, sample_date_time);
+
+analyze public.water_quality;
+"""
+
 
 class WaterQualityQueryable(Queryable):
 
     def __init__(self):
-        self.conn_str = PostgresReadWriteConfig().__str__()
-        self.engine = create_engine(self.conn_str)
-
         self.query_str = """
         select 
                 sample_date_time::timestamp as sample_date_time,
@@ -83,10 +87,38 @@ class WaterQualityQueryable(Queryable):
     def query(self) -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
         return geopandas.read_postgis(
             sql=self.query_str,
-            con=self.engine, geom_col='geometry', crs="EPSG:26914")
+            con=get_engine(EngineRole.READ_WRITE), geom_col='geometry', crs="EPSG:26914")
+
+    async def query_async(self, engines: AsyncEngines) -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
+        return await read_postgres_async(self.query_str, engines.get(EngineRole.READ_WRITE), geom_col='geometry',
+                                         crs="EPSG:26914")
+
+    def source_stamp(self) -> Optional[str]:
+        return postgres_stamp(["staging.WaterQuality_NWIS_EPA", "staging.WaterQuality_COA", "staging.NWIS_Sites",
+                               "public.watershed"])
 
 
 class WaterQualityTransformable(Transformable):
 
+    schema = {
+        "parameter": "category",
+        "organization_name": "category",
+        "sample_location_id": "category",
+        "sample_location": "category",
+        "sample_type": "category",
+        "value": "float64",
+        "unit": "category",
+        "sample_status": "category",
+        "canonical_parameter": "category",
+        "canonical_unit": "category"
+    }
+
     def transform(self, df: Union[geopandas.GeoDataFrame, pandas.DataFrame]) -> geopandas.GeoDataFrame:
-        return df
+        df = df.merge(parameter_aliases, how="left", on=["parameter", "unit"], validate="many_to_one")
+        df["canonical_unit"] = df["canonical_parameter"].map(units)
+        return geopandas.GeoDataFrame(df, geometry="geometry", crs="EPSG:26914")
+
+
+def create_water_quality_indexes():
+    with get_engine(EngineRole.READ_WRITE).begin() as conn:
+        conn.execute(text(water_quality_indexes_query))
@@ -1,13 +1,12 @@
 import os
-from typing import Union
+from typing import Optional, Union
 
 import geopandas
 import pandas
 from shapely.wkt import loads
-from sqlalchemy import create_engine
 
-from config import PostgresReadWriteConfig
-from pipelines import Transformable, Queryable
+from config import AsyncEngines, EngineRole, get_engine
+from pipelines import Transformable, Queryable, postgres_stamp, read_postgres_async
 
 geopandas.options.io_engine = "pyogrio"
 
@@ -15,9 +14,6 @@ geopandas.options.io_engine = "pyogrio"
 class WatershedQueryable(Queryable):
 
     def __init__(self):
-        self.conn_str = PostgresReadWriteConfig().__str__()
-        self.engine = create_engine(self.conn_str)
-
         self.query_str = """
         SELECT * FROM public.watershed w
         """
@@ -25,7 +21,14 @@ class WatershedQueryable(Queryable):
     def query(self) -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
         return geopandas.read_postgis(
             sql=self.query_str,
-            con=self.engine, geom_col='geometry', crs="EPSG:26914")
+            con=get_engine(EngineRole.READ_WRITE), geom_col='geometry', crs="EPSG:26914")
+
+    async def query_async(self, engines: AsyncEngines) -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
+        return await read_postgres_async(self.query_str, engines.get(EngineRole.READ_WRITE), geom_col='geometry',
+                                         crs="EPSG:26914")
+
+    def source_stamp(self) -> Optional[str]:
+        return postgres_stamp(["public.watershed"])
 
 
 class WatershedTransformable(Transformable):
@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+from pathlib import Path
+from typing import Optional, Union
+
+import geopandas
+import pandas
+import pyarrow.feather
+import pyarrow.ipc
+import pyarrow.parquet
+from sqlalchemy import text
+
+from config import QueryCacheConfig
+
+
+class QueryCache:
+
+    def __init__(self, cache_dir: str, max_bytes: int, file_format: str = "parquet"):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.file_format = file_format
+        self.versions_path = self.cache_dir / "versions.json"
+        self.lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def key(self, sql: str, tables: list[str], stamps: list[str] = None) -> str:
+        versions = self.__versions()
+        normalized_sql = re.sub(r"\s+", " ", sql).strip().rstrip(";")
+        table_stamps = [f"{table}={versions.get(table, '')}" for table in sorted(tables)]
+        parts = [normalized_sql, *table_stamps, *(stamps or [])]
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Union[geopandas.GeoDataFrame, pandas.DataFrame]]:
+        path = self.cache_dir / f"{key}.{self.file_format}"
+        try:
+            if self.file_format == "feather":
+                metadata = pyarrow.ipc.open_file(path).schema.metadata or {}
+                df = geopandas.read_feather(path) if b"geo" in metadata \
+                    else pyarrow.feather.read_table(path).to_pandas()
+            else:
+                metadata = pyarrow.parquet.read_schema(path).metadata or {}
+                df = geopandas.read_parquet(path) if b"geo" in metadata else pandas.read_parquet(path)
+        except (FileNotFoundError, OSError):
+            return None
+        os.utime(path)
+        return df
+
+    def put(self, key: str, df: Union[geopandas.GeoDataFrame, pandas.DataFrame]):
+        path = self.cache_dir / f"{key}.{self.file_format}"
+        temp_path = self.cache_dir / f"{key}.{uuid.uuid4().hex}.tmp"
+        if self.file_format == "feather" and isinstance(df, geopandas.GeoDataFrame):
+            df.to_feather(temp_path, index=None)
+        elif self.file_format == "feather":
+            pyarrow.feather.write_feather(pyarrow.Table.from_pandas(df), temp_path)
+        else:
+            df.to_parquet(temp_path)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def invalidate(self, table: str):
+        with self.lock:
+            versions = self.__versions()
+            versions[table] = uuid.uuid4().hex
+            temp_path = self.cache_dir / f"versions.{uuid.uuid4().hex}.tmp"
+            temp_path.write_text(json.dumps(versions))
+            os.replace(temp_path, self.versions_path)
+
+    def evict(self):
+        with self.lock:
+            entries = []
+            for path in self.cache_dir.glob(f"*.{self.file_format}"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+
+    def clear(self):
+        with self.lock:
+            for path in self.cache_dir.glob(f"*.{self.file_format}"):
+                path.unlink(missing_ok=True)
+
+    def __versions(self) -> dict:
+        try:
+            return json.loads(self.versions_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+
+_cache = None
+_memo_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> QueryCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            config = QueryCacheConfig()
+            _cache = QueryCache(config.cache_dir, config.max_bytes)
+        return _cache
+
+
+def get_memo_cache() -> QueryCache:
+    global _memo_cache
+    with _cache_lock:
+        if _memo_cache is None:
+            config = QueryCacheConfig()
+            _memo_cache = QueryCache(config.memo_dir, config.memo_max_bytes, file_format="feather")
+        return _memo_cache
+
+
+def table_stamp(tables: list[str], con) -> str:
+    qualified = [table if "." in table else f"public.{table}" for table in tables]
+    with con.connect() as conn:
+        rows = conn.execute(text("""
+            select schemaname || '.' || relname, relid, n_live_tup, n_tup_ins, n_tup_upd, n_tup_del,
+                   greatest(last_analyze, last_autoanalyze)
+            from pg_stat_all_tables
+            where schemaname || '.' || relname = any(:tables)
+            order by 1
+        """), {"tables": qualified}).fetchall()
+    return json.dumps([[str(value) for value in row] for row in rows])
+
+
+def read_postgis(sql: str, tables: list[str], con, geom_col: str = "geometry", crs=None) -> geopandas.GeoDataFrame:
+    if not QueryCacheConfig().enabled:
+        return geopandas.read_postgis(sql=sql, con=con, geom_col=geom_col, crs=crs)
+    cache = get_query_cache()
+    key = cache.key(sql, tables, [table_stamp(tables, con)])
+    df = cache.get(key)
+    if df is None:
+        df = geopandas.read_postgis(sql=sql, con=con, geom_col=geom_col, crs=crs)
+        cache.put(key, df)
+    return df
+
+
+def read_sql(sql: str, tables: list[str], con) -> pandas.DataFrame:
+    if not QueryCacheConfig().enabled:
+        return pandas.read_sql_query(sql=sql, con=con)
+    cache = get_query_cache()
+    key = cache.key(sql, tables, [table_stamp(tables, con)])
+    df = cache.get(key)
+    if df is None:
+        df = pandas.read_sql_query(sql=sql, con=con)
+        cache.put(key, df)
+    return df
+
+
+def memo_key(cache: QueryCache, queryable, stamp: str) -> str:
+    return cache.key(getattr(queryable, "query_str", ""), [],
+                     [f"{type(queryable).__module__}.{type(queryable).__qualname__}", stamp])
+
+
+def memoized_query(queryable) -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
+    stamp = queryable.source_stamp()
+    if stamp is None:
+        return queryable.query()
+    cache = get_memo_cache()
+    key = memo_key(cache, queryable, stamp)
+    df = cache.get(key)
+    if df is None:
+        df = queryable.query()
+        cache.put(key, df)
+    return df
+
+
+async def memoized_query_async(queryable, engines) -> Union[geopandas.GeoDataFrame, pandas.DataFrame]:
+    stamp = await asyncio.to_thread(queryable.source_stamp)
+    if stamp is None:
+        return await queryable.query_async(engines)
+    cache = get_memo_cache()
+    key = memo_key(cache, queryable, stamp)
+    df = await asyncio.to_thread(cache.get, key)
+    if df is None:
+        df = await queryable.query_async(engines)
+        await asyncio.to_thread(cache.put, key, df)
+    return df
+
+
+def invalidate(table: str):
+    get_query_cache().invalidate(table)
@@ -0,0 +1,76 @@
+import pandas
+
+parameters_map = {
+    "temperature": ["Temperature, water", "Temperature, sample", "WATER TEMPERATURE"],
+    "phosphorus": [
+        "PHOSPHORUS AS P",
+        "ORTHOPHOSPHORUS AS P",
+        "Orthophosphate",
+        "Orthophosphate",
+        "Orthophosphate",
+        "PHOSPHATE AS PO4",
+        "Phosphorus"
+    ],
+    "nitrates": [
+        "NITRATE/NITRITE AS N",
+        "NITRATE AS N",
+        "Nitrate",
+        "Nitrogen, mixed forms (NH3), (NH4), organic, (NO2) and (NO3)",
+        "Organic Nitrogen",
+        "Inorganic nitrogen (nitrate and nitrite)",
+        "Inorganic nitrogen (nitrate and nitrite) ***retired***use Nitrate + Nitrite"
+    ],
+    "ph": ["PH", "pH"],
+    "ammonia": ["Ammonia and ammonium", "AMMONIA AS N", "Ammonia"],
+    "turbidity": ["Turbidity", "TURBIDITY"],
+    "conductivity": ["Specific conductance", "CONDUCTIVITY"],
+    "tss": ["Total suspended solids", "TOTAL SUSPENDED SOLIDS"],
+    "tds": ["TOTAL DISSOLVED SOLIDS", "Total dissolved solids"],
+    "ecoli": ["E COLI BACTERIA", "FECAL COLIFORM BACTERIA", "Fecal Coliform", "Escherichia coli", "Total Coliform"]
+}
+
+parameters_units_map = {
+    "temperature": ["deg C", "Deg. Celsius"],
+    "nitrates": ["mg/l as N", "mg/L", "mg/l asNO3", "MG/L", "mg/l asNO2", "mg/l NO3", "mg/l"],
+    "phosphorus": ["mg/L", "mg/l as P", "mg/l asPO4", "MG/L", "mg/l", "mg/l as P", "mg/l PO4"],
+    "ph": ["std units", "Standard units", "None"],
+    "ammonia": ["mg/L", "mg/L", "MG/L", "mg/l NH4", "mg/l as N"],
+    "turbidity": ["NTU", "None"],
+    "conductivity": ["uS/cm", "uS/cm @25C"],
+    "tss": ["mg/L", "Parts Per Million (PPM)", "MG/L", "mg/l"],
+    "tds": ["MG/L", "Parts Per Million (PPM)", "mg/L", "mg/l"],
+    "ecoli": ["MPN/100ML", "Colonies/100mL", "#/100mL", "cfu/100ml"]
+}
+
+parameters = [
+    "temperature",
+    "phosphorus",
+    "nitrates",
+    "ph",
+    "ammonia",
+    "turbidity",
+    "conductivity",
+    "tss",
+    "tds",
+    "ecoli"
+]
+
+units = {
+    "temperature": "deg. C",
+    "nitrates": "mg/l",
+    "phosphorus": "mg/l",
+    "ph": "standard units",
+    "ammonia": "mg/l",
+    "turbidity": "NTU",
+    "conductivity": "uS/cm",
+    "tss": "mg/L",
+    "tds": "mg/L",
+    "ecoli": "cfu/100ml"
+}
+
+parameter_aliases = pandas.DataFrame(
+    [(key, name, unit)
+     for key in parameters
+     for name in dict.fromkeys(parameters_map[key])
+     for unit in dict.fromkeys(parameters_units_map[key])],
+    columns=["canonical_parameter", "parameter", "unit"])